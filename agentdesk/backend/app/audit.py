@@ -0,0 +1,172 @@
+import asyncio
+import datetime
+import logging
+from itertools import groupby
+from typing import Optional
+
+from cachetools import TTLCache
+from sqlalchemy import BigInteger, Column, DateTime, MetaData, String, Table, Text, Uuid, column, insert, select, table, text
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .database import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+# Most rows written per INSERT and the longest an entry waits for its batch to fill
+AUDIT_BATCH_SIZE = 500
+AUDIT_FLUSH_INTERVAL = 0.05
+
+# Core view of the audit_logs table from the multi-tenant migration; id and created_at are
+# server defaults. Kept off Base.metadata so create_all never tries to build it.
+audit_logs = Table(
+    "audit_logs",
+    MetaData(),
+    Column("id", BigInteger),
+    Column("organization_id", postgresql.UUID(as_uuid=True), nullable=False),
+    Column("user_id", postgresql.UUID(as_uuid=True)),
+    Column("desk_id", postgresql.UUID(as_uuid=True)),
+    Column("actor_type", String(50), nullable=False),
+    Column("action", postgresql.ENUM(name="auditaction", create_type=False), nullable=False),
+    Column("resource_type", String(100), nullable=False),
+    Column("resource_id", postgresql.UUID(as_uuid=True)),
+    Column("description", Text),
+    Column("changes", postgresql.JSONB),
+    Column("meta_data", postgresql.JSONB),
+    Column("ip_address", String(45)),
+    Column("user_agent", String(500)),
+    Column("created_at", DateTime(timezone=True)),
+)
+
+# Only the id, to check an organization exists before auditing against it
+organizations = Table("organizations", MetaData(), Column("id", Uuid, primary_key=True))
+
+# Organizations already found, so repeat writes skip the lookup
+_known_organizations = TTLCache(maxsize=4096, ttl=300)
+
+# Only the actor columns an audit listing shows
+_users = table("users", column("id"), column("email"))
+_desks = table("desks", column("id"), column("desk_id"), column("title"))
+
+# Created by start_audit_writer in the app lifespan, so they belong to the serving event loop
+audit_queue: Optional[asyncio.Queue] = None
+_writer: Optional[asyncio.Task] = None
+
+# Queued by stop_audit_writer behind every pending entry
+_STOP = object()
+
+
+async def organization_exists(db: AsyncSession, organization_id) -> bool:
+    """Whether audit rows can reference this organization"""
+    if organization_id in _known_organizations:
+        return True
+    found = await db.scalar(select(organizations.c.id).where(organizations.c.id == organization_id))
+    if found is not None:
+        _known_organizations[organization_id] = True
+    return found is not None
+
+
+def record_audit(**entry):
+    """Queue an audit_logs row for the background writer instead of inserting it inline"""
+    if audit_queue is None:
+        logger.warning("Audit writer is not running; dropped %s entry", entry.get("action"))
+        return
+    audit_queue.put_nowait(entry)
+
+
+async def _write_batch(entries):
+    def organization(entry):
+        return str(entry["organization_id"])
+
+    async with SessionLocal() as db:
+        # The RLS policy checks each row against app.current_org_id, so switch it per organization.
+        # Each organization gets its own savepoint: a bad group is dropped without losing the rest.
+        for organization_id, rows in groupby(sorted(entries, key=organization), key=organization):
+            rows = list(rows)
+            try:
+                async with db.begin_nested():
+                    if db.bind.dialect.name == "postgresql":
+                        await db.execute(
+                            text("SELECT set_config('app.current_org_id', :org_id, true)"), {"org_id": organization_id}
+                        )
+                    await db.execute(insert(audit_logs), rows)
+            except IntegrityError:
+                logger.exception("Dropped %d audit log entries for organization %s", len(rows), organization_id)
+        await db.commit()
+
+
+async def _next_batch(queue: asyncio.Queue):
+    """Up to AUDIT_BATCH_SIZE entries, and whether the stop marker was reached"""
+    loop = asyncio.get_running_loop()
+    entry = await queue.get()
+    if entry is _STOP:
+        return [], True
+    entries = [entry]
+    deadline = loop.time() + AUDIT_FLUSH_INTERVAL
+    while len(entries) < AUDIT_BATCH_SIZE:
+        remaining = deadline - loop.time()
+        if remaining <= 0:
+            break
+        try:
+            entry = await asyncio.wait_for(queue.get(), remaining)
+        except asyncio.TimeoutError:
+            break
+        if entry is _STOP:
+            return entries, True
+        entries.append(entry)
+    return entries, False
+
+
+async def run_audit_writer(queue: asyncio.Queue):
+    """Drain the audit queue in batches of up to AUDIT_BATCH_SIZE rows, one commit per batch"""
+    while True:
+        entries, stopping = await _next_batch(queue)
+        if entries:
+            try:
+                await _write_batch(entries)
+            except SQLAlchemyError:
+                logger.exception("Dropped %d audit log entries", len(entries))
+        if stopping:
+            return
+
+
+def start_audit_writer():
+    global audit_queue, _writer
+    audit_queue = asyncio.Queue()
+    _writer = asyncio.create_task(run_audit_writer(audit_queue))
+
+
+async def stop_audit_writer():
+    """Stop taking entries and wait until everything already queued, including the batch in
+    flight, has been written"""
+    global audit_queue, _writer
+    queue, writer = audit_queue, _writer
+    audit_queue = _writer = None
+    queue.put_nowait(_STOP)
+    await writer
+
+
+async def list_audit_logs(
+    db: AsyncSession, organization_id, before: Optional[datetime.datetime] = None, limit: int = 100
+):
+    """Newest-first audit entries with actor email/desk resolved in the same query
+
+    Page with ``before`` set to the last created_at seen; rows come back as mappings.
+    """
+    stmt = (
+        select(
+            audit_logs,
+            _users.c.email.label("user_email"),
+            _desks.c.desk_id.label("actor_desk_id"),
+            _desks.c.title.label("desk_title"),
+        )
+        .outerjoin(_users, _users.c.id == audit_logs.c.user_id)
+        .outerjoin(_desks, _desks.c.id == audit_logs.c.desk_id)
+        .where(audit_logs.c.organization_id == organization_id)
+        .order_by(audit_logs.c.created_at.desc())
+        .limit(limit)
+    )
+    if before is not None:
+        stmt = stmt.where(audit_logs.c.created_at < before)
+    return (await db.execute(stmt)).mappings().all()
@@ -3,17 +3,38 @@ AgentDesk Core - Basic Implementation
 A starting point for the hierarchical AI agent organization system
 """
 
+from collections import defaultdict
 from enum import Enum
-from typing import Optional, List, Dict, Any
+from functools import cached_property, lru_cache
+from typing import Optional, List, Dict, Any, Tuple, AsyncIterator
 from dataclasses import dataclass, field
 from datetime import datetime
 import asyncio
+import hashlib
+import httpx
+import itertools
 import json
-import google.generativeai as genai
+import logging
+from google import genai
+from google.genai import types as genai_types
 import os
+import time
+import weakref
 import mlflow
+import orjson
 import chromadb
-from src.utils.security import PIIMasker
+from chromadb.utils.embedding_functions import DefaultEmbeddingFunction
+from aiolimiter import AsyncLimiter
+try:
+    from tqdm import tqdm
+except ImportError:  # progress bars for large ingests are optional
+    tqdm = None
+from ..utils.security import PIIMasker
+from .batch import BatchProcessor
+from .routing import TaskRouter
+from .store import TaskStore, new_task_id
+
+logger = logging.getLogger("agentdesk")
 
 class AgentRole(Enum):
     """Standard business roles for agents"""
@@ -53,7 +74,7 @@ class Priority(Enum):
     CRITICAL = 4
 
 
-@dataclass
+@dataclass(frozen=True)
 class LLMConfig:
     """Configuration for LLM provider"""
     provider: str  # "anthropic", "openai", "local", etc.
@@ -63,6 +84,12 @@ class LLMConfig:
     api_key: Optional[str] = None
     
     def to_dict(self) -> Dict[str, Any]:
+        # A copy, so a caller editing the result can't change what later calls return
+        return dict(self._dict)
+
+    @cached_property
+    def _dict(self) -> Dict[str, Any]:
+        # Built once; configs are not changed after a desk is created
         return {
             "provider": self.provider,
             "model": self.model,
@@ -71,29 +98,215 @@ class LLMConfig:
         }
 
 
+# Live knowledge bases by a never-reused serial, so the module-level query cache can reach
+# them without holding them alive
+_knowledge_bases: "weakref.WeakValueDictionary[int, KnowledgeBase]" = weakref.WeakValueDictionary()
+_knowledge_base_serials = itertools.count()
+
+
+# The same model Chroma applies to collections created without an embedding function, so
+# vectors computed here match the stored ones
+_embedder = DefaultEmbeddingFunction()
+
+
+@lru_cache(maxsize=4096)
+def _embed_cached(text: str) -> Tuple[float, ...]:
+    """Embed a query once; shared by knowledge base search and the semantic cache"""
+    return tuple(map(float, _embedder([text])[0]))
+
+
+@lru_cache(maxsize=1024)
+def _cached_query(kb_id: int, generation: int, query_text: str, n_results: int) -> Tuple[str, ...]:
+    """Search once per (knowledge base, generation, query); errors are not cached"""
+    results = _knowledge_bases[kb_id].collection.query(
+        query_embeddings=[list(_embed_cached(query_text))], n_results=n_results
+    )
+    return tuple(results['documents'][0]) if results['documents'] else ()
+
+
+def get_performance_stats() -> Dict[str, Any]:
+    """Hit/miss counters for the knowledge base query and query embedding caches"""
+    return {
+        "knowledge_base_query_cache": _cached_query.cache_info()._asdict(),
+        "query_embedding_cache": _embed_cached.cache_info()._asdict(),
+    }
+
+
+# One pooled HTTP/2 client per event loop for every provider SDK call, so desks reuse keep-alive
+# connections instead of paying a TLS handshake per call. Pools are bound to the loop that
+# opened them, so a later asyncio.run gets its own; see close_provider_http_client
+_provider_http_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def provider_http_client() -> httpx.AsyncClient:
+    """The running loop's shared provider HTTP client"""
+    loop = asyncio.get_running_loop()
+    client = _provider_http_clients.get(loop)
+    if client is None or client.is_closed:
+        client = _provider_http_clients[loop] = httpx.AsyncClient(
+            http2=True,
+            limits=httpx.Limits(max_keepalive_connections=100, max_connections=200),
+            timeout=httpx.Timeout(60.0, connect=5.0),
+        )
+    return client
+
+
+async def close_provider_http_client():
+    """Close the running loop's provider HTTP client, if one was opened"""
+    client = _provider_http_clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.aclose()
+
+
+@lru_cache(maxsize=8)
+def _get_gemini_client(api_key: str, http_client: httpx.AsyncClient) -> genai.Client:
+    """Build the client once per (API key, shared HTTP client) instead of on every task
+
+    Each genai.Client carries its own key, so desks with different keys never share credentials,
+    while all of them send requests through the same connection pool.
+    """
+    return genai.Client(
+        api_key=api_key, http_options=genai_types.HttpOptions(httpx_async_client=http_client)
+    )
+
+
+# HNSW settings for knowledge collections: cosine suits sentence embeddings, and the higher
+# construction/search ef buy recall at insert time rather than per query. Only applied when a
+# collection is created; use KnowledgeBase.rebuild_index() to move an existing one over.
+KNOWLEDGE_HNSW_SETTINGS = {
+    "hnsw:space": "cosine",
+    "hnsw:construction_ef": 200,
+    "hnsw:search_ef": 100,
+    "hnsw:M": 16,
+}
+
+
 class KnowledgeBase:
     """RAG Knowledge Base using ChromaDB"""
     def __init__(self, collection_name: str = "agent_knowledge", persist_path: str = "./agent_knowledge"):
         self.client = chromadb.PersistentClient(path=persist_path)
-        self.collection = self.client.get_or_create_collection(name=collection_name)
+        self.collection = self.client.get_or_create_collection(
+            name=collection_name, metadata=KNOWLEDGE_HNSW_SETTINGS
+        )
+        # Bumped on every write so cached query results from before it are never served
+        self.generation = 0
+        self.serial = next(_knowledge_base_serials)
+        _knowledge_bases[self.serial] = self
         
-    def add_documents(self, documents: List[str], metadatas: List[Dict] = None, ids: List[str] = None):
-        """Add documents to knowledge base"""
+    def add_documents(
+        self,
+        documents: List[str],
+        metadatas: List[Dict] = None,
+        ids: List[str] = None,
+        embeddings: Optional[List[List[float]]] = None,
+        batch_size: int = 500
+    ) -> int:
+        """Add documents to knowledge base
+
+        Pass embeddings when the caller already has them to skip Chroma's embedding function.
+        Documents are upserted batch_size at a time, so re-running an interrupted ingest with
+        the same ids overwrites instead of failing on duplicates. Returns how many documents
+        were upserted; a progress bar is shown for multi-batch ingests when tqdm is installed.
+        """
         if ids is None:
-            ids = [f"doc_{datetime.now().timestamp()}_{i}" for i in range(len(documents))]
-        self.collection.add(documents=documents, metadatas=metadatas, ids=ids)
+            batch_ts = time.time_ns()
+            ids = [f"doc_{batch_ts}_{i}" for i in range(len(documents))]
+        starts = range(0, len(documents), batch_size)
+        if tqdm is not None and len(documents) > batch_size:
+            starts = tqdm(starts, desc="Ingesting documents", unit="batch")
+        try:
+            for start in starts:
+                end = start + batch_size
+                self.collection.upsert(
+                    ids=ids[start:end],
+                    documents=documents[start:end],
+                    metadatas=metadatas[start:end] if metadatas else None,
+                    embeddings=embeddings[start:end] if embeddings else None
+                )
+        finally:
+            self.generation += 1
+        return len(documents)
+
+    def rebuild_index(self):
+        """Recreate the collection with KNOWLEDGE_HNSW_SETTINGS, carrying over every document
+
+        Stored embeddings are reused, so nothing is re-embedded.
+        """
+        name = self.collection.name
+        contents = self.collection.get(include=["documents", "metadatas", "embeddings"])
+        self.client.delete_collection(name)
+        self.collection = self.client.create_collection(name=name, metadata=KNOWLEDGE_HNSW_SETTINGS)
+        if contents['ids']:
+            self.collection.add(
+                ids=contents['ids'],
+                documents=contents['documents'],
+                metadatas=contents['metadatas'],
+                embeddings=contents['embeddings']
+            )
+        self.generation += 1
         
     def query(self, query_text: str, n_results: int = 3) -> List[str]:
-        """Query knowledge base"""
+        """Query knowledge base; repeated queries are served from an LRU cache"""
         try:
-            results = self.collection.query(query_texts=[query_text], n_results=n_results)
-            return results['documents'][0] if results['documents'] else []
+            return list(_cached_query(self.serial, self.generation, query_text, n_results))
         except Exception as e:
-            print(f"RAG Query failed: {e}")
+            logger.warning("RAG query failed: %s", e)
             return []
 
 
-@dataclass
+class SemanticCache:
+    """LLM response cache in ChromaDB, matched on the meaning of the task text
+
+    A task whose title + description embeds within ``max_distance`` (cosine) of an earlier one
+    in the same scope is answered with that earlier result instead of an LLM call. Desks scope
+    entries to themselves and the knowledge base context they retrieved, since both go into
+    the prompt.
+    """
+    def __init__(
+        self,
+        collection_name: str = "llm_responses",
+        persist_path: str = "./agent_knowledge",
+        max_distance: float = 0.05
+    ):
+        self.client = chromadb.PersistentClient(path=persist_path)
+        self.collection = self.client.get_or_create_collection(
+            name=collection_name, metadata={"hnsw:space": "cosine"}
+        )
+        self.max_distance = max_distance
+
+    def lookup(self, query_text: str, scope: str) -> Optional[Dict[str, Any]]:
+        """Return the cached result for a near-identical query in the scope, or None"""
+        try:
+            results = self.collection.query(
+                query_embeddings=[list(_embed_cached(query_text))],
+                n_results=1,
+                where={"scope": scope}
+            )
+        except Exception as e:
+            logger.warning("Semantic cache lookup failed: %s", e)
+            return None
+        if not results['ids'][0] or results['distances'][0][0] > self.max_distance:
+            return None
+        return json.loads(results['metadatas'][0][0]['answer'])
+
+    def store(self, query_text: str, scope: str, result: Dict[str, Any]):
+        """Cache a successful result; the same query in the same scope overwrites"""
+        cache_id = hashlib.sha256(f"{scope}\0{query_text}".encode()).hexdigest()
+        try:
+            self.collection.upsert(
+                ids=[cache_id],
+                documents=[query_text],
+                # Embedded by the lookup that missed; reusing it skips a second embedding
+                embeddings=[list(_embed_cached(query_text))],
+                metadatas=[{"scope": scope, "answer": json.dumps(result, default=str)}]
+            )
+        except Exception as e:
+            logger.warning("Semantic cache store failed: %s", e)
+
+
+@dataclass(slots=True)
 class AgentMemory:
     """Agent's memory and context"""
     conversation_history: List[Dict[str, str]] = field(default_factory=list)
@@ -117,20 +330,22 @@ class AgentMemory:
 
     def export_to_jsonl(self, file_path: str):
         """Export conversation history to JSONL format for fine-tuning"""
-        with open(file_path, 'w') as f:
-            for i in range(0, len(self.conversation_history) - 1, 2):
-                if i + 1 < len(self.conversation_history):
-                    # Simple user/model pair assumption
-                    entry = {
-                        "messages": [
-                            {"role": self.conversation_history[i]["role"], "content": self.conversation_history[i]["content"]},
-                            {"role": self.conversation_history[i+1]["role"], "content": self.conversation_history[i+1]["content"]}
-                        ]
-                    }
-                    f.write(json.dumps(entry) + '\n')
-
-
-@dataclass
+        history = self.conversation_history
+        # Simple user/model pair assumption; a trailing unpaired turn is left out
+        lines = [
+            orjson.dumps({
+                "messages": [
+                    {"role": user["role"], "content": user["content"]},
+                    {"role": model["role"], "content": model["content"]}
+                ]
+            }) + b"\n"
+            for user, model in zip(history[0::2], history[1::2])
+        ]
+        with open(file_path, 'wb') as f:
+            f.writelines(lines)
+
+
+@dataclass(frozen=True, slots=True)
 class Artifact:
     """Output artifact from a task"""
     artifact_id: str
@@ -140,7 +355,7 @@ class Artifact:
     created_at: datetime = field(default_factory=datetime.now)
 
 
-@dataclass
+@dataclass(slots=True)
 class Task:
     """Represents a task in the system"""
     task_id: str
@@ -173,6 +388,211 @@ class Task:
             "created_at": self.created_at.isoformat(),
         }
 
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "Task":
+        """Rebuild a task from the fields TaskStore saved"""
+        data = dict(data)
+        data["status"] = TaskStatus(data["status"])
+        data["priority"] = Priority(data["priority"])
+        data["artifacts"] = [
+            Artifact(**{**a, "created_at": datetime.fromisoformat(a["created_at"])})
+            for a in data["artifacts"]
+        ]
+        for key in ("created_at", "updated_at", "completed_at"):
+            if data[key] is not None:
+                data[key] = datetime.fromisoformat(data[key])
+        return cls(**data)
+
+
+# Requests per minute each provider accepts; override per provider with e.g. GEMINI_RPM=300.
+# Calls wait for budget up front instead of spending round trips on 429s and retries.
+PROVIDER_RPM_DEFAULTS = {"anthropic": 50, "openai": 500, "gemini": 60}
+_LIMITERS: Dict[str, AsyncLimiter] = {}
+
+
+def _provider_limiter(provider: str) -> AsyncLimiter:
+    """Token bucket shared by every desk calling the given provider"""
+    if provider not in _LIMITERS:
+        rpm = int(os.getenv(f"{provider.upper()}_RPM", PROVIDER_RPM_DEFAULTS.get(provider, 60)))
+        _LIMITERS[provider] = AsyncLimiter(rpm, 60)
+    return _LIMITERS[provider]
+
+
+# MLflow runs are written by one background worker so tracking-server round trips never sit
+# between an LLM result and the caller. The queue and worker are bound to the loop that made
+# them, so each running loop gets its own and a later asyncio.run never waits on a dead one.
+_mlflow_workers: Dict[asyncio.AbstractEventLoop, Tuple[asyncio.Queue, asyncio.Task]] = {}
+
+
+def _write_mlflow_run(entry: Dict[str, Any]):
+    mlflow.set_experiment("AgentDesk_Operations")
+    with mlflow.start_run(run_name=entry["run_name"], nested=True):
+        mlflow.log_params(entry["params"])
+        for artifact_file, text in entry["texts"].items():
+            mlflow.log_text(text, artifact_file)
+
+
+async def _run_mlflow_worker(queue: asyncio.Queue):
+    while True:
+        entry = await queue.get()
+        try:
+            await asyncio.to_thread(_write_mlflow_run, entry)
+        except Exception as e:
+            # Tracking is best effort; a failed run never fails the task
+            logger.warning("MLflow logging failed: %s", e)
+        finally:
+            queue.task_done()
+
+
+def queue_mlflow_run(entry: Dict[str, Any]):
+    """Hand a run to the running loop's MLflow worker, starting it on first use"""
+    loop = asyncio.get_running_loop()
+    if loop not in _mlflow_workers:
+        queue = asyncio.Queue()
+        worker = loop.create_task(_run_mlflow_worker(queue))
+        # asyncio.run cancels the worker on the way out, which drops the loop's entry
+        worker.add_done_callback(lambda _: _mlflow_workers.pop(loop, None))
+        _mlflow_workers[loop] = (queue, worker)
+    _mlflow_workers[loop][0].put_nowait(entry)
+
+
+async def flush_mlflow_runs():
+    """Wait until every run queued on the running loop has been written"""
+    workers = _mlflow_workers.get(asyncio.get_running_loop())
+    if workers is not None:
+        await workers[0].join()
+
+
+def _gemini_generation_config(temperature: float, max_tokens: int) -> genai_types.GenerateContentConfig:
+    return genai_types.GenerateContentConfig(temperature=temperature, max_output_tokens=max_tokens)
+
+
+class LLMClient:
+    """Provider access shared by every desk with the same provider, model and API key
+
+    Owns the provider's rate limiter and SDK objects, so identical configs are set up once.
+    Generation settings differ per desk, so callers pass their own temperature and max_tokens.
+    """
+
+    def __init__(self, config: LLMConfig):
+        self.config = config
+        self.limiter = _provider_limiter(config.provider)
+        self.supports_streaming = config.provider == "gemini"
+
+    async def invoke(
+        self, system_prompt: str, task: Task, temperature: float, max_tokens: int
+    ) -> Dict[str, Any]:
+        """Run the task against the provider, waiting for its rate limit first"""
+        # Here you would call the actual LLM API based on provider
+        if self.config.provider == "anthropic":
+            async with self.limiter:
+                return await self._call_anthropic(system_prompt, task, temperature, max_tokens)
+        elif self.config.provider == "openai":
+            async with self.limiter:
+                return await self._call_openai(system_prompt, task, temperature, max_tokens)
+        elif self.config.provider == "gemini":
+            async with self.limiter:
+                return await self._call_gemini(system_prompt, task, temperature, max_tokens)
+        return {"result": "LLM integration pending"}
+
+    def stream(self, system_prompt: str, task: Task, temperature: float, max_tokens: int) -> AsyncIterator[str]:
+        """Answer chunks as they are generated; only when supports_streaming"""
+        return self._call_gemini_stream(system_prompt, task, temperature, max_tokens)
+
+    async def _call_anthropic(
+        self, system_prompt: str, task: Task, temperature: float, max_tokens: int
+    ) -> Dict[str, Any]:
+        """Call Anthropic Claude API"""
+        # Placeholder - integrate with actual Anthropic SDK
+        # from anthropic import AsyncAnthropic
+        # client = AsyncAnthropic(api_key=self.config.api_key, http_client=provider_http_client())
+        # message = await client.messages.create(...)
+        return {
+            "provider": "anthropic",
+            "model": self.config.model,
+            "result": "Task completed (implementation pending)"
+        }
+    
+    async def _call_openai(
+        self, system_prompt: str, task: Task, temperature: float, max_tokens: int
+    ) -> Dict[str, Any]:
+        """Call OpenAI API"""
+        # Placeholder - integrate with actual OpenAI SDK
+        # from openai import AsyncOpenAI
+        # client = AsyncOpenAI(api_key=self.config.api_key, http_client=provider_http_client())
+        return {
+            "provider": "openai",
+            "model": self.config.model,
+            "result": "Task completed (implementation pending)"
+        }
+
+    async def _call_gemini(
+        self, system_prompt: str, task: Task, temperature: float, max_tokens: int
+    ) -> Dict[str, Any]:
+        """Call Google Gemini API"""
+        api_key = self.config.api_key or os.getenv("GEMINI_API_KEY")
+        if not api_key:
+             return {"error": "Gemini API key not found"}
+
+        # Combine system prompt and task details
+        full_prompt = f"{system_prompt}\n\nTask: {task.title}\n{task.description}"
+        
+        try:
+            client = _get_gemini_client(api_key, provider_http_client())
+            response = await client.aio.models.generate_content(
+                model=self.config.model or "gemini-pro",
+                contents=full_prompt,
+                config=_gemini_generation_config(temperature, max_tokens)
+            )
+
+            return {
+                "provider": "gemini",
+                "model": self.config.model,
+                "result": response.text
+            }
+        except Exception as e:
+            return {"error": str(e)}
+
+    async def _call_gemini_stream(
+        self, system_prompt: str, task: Task, temperature: float, max_tokens: int
+    ) -> AsyncIterator[str]:
+        """Stream a Gemini answer through the SDK's async client"""
+        api_key = self.config.api_key or os.getenv("GEMINI_API_KEY")
+        if not api_key:
+            raise RuntimeError("Gemini API key not found")
+
+        full_prompt = f"{system_prompt}\n\nTask: {task.title}\n{task.description}"
+        client = _get_gemini_client(api_key, provider_http_client())
+        async with self.limiter:
+            chunks = await client.aio.models.generate_content_stream(
+                model=self.config.model or "gemini-pro",
+                contents=full_prompt,
+                config=_gemini_generation_config(temperature, max_tokens)
+            )
+        async for chunk in chunks:
+            if chunk.text:
+                yield chunk.text
+
+
+class LLMClientRegistry:
+    """One LLMClient per (provider, model, API key hash)
+
+    temperature and max_tokens are left out of the key; desks pass their own on every call.
+    """
+
+    def __init__(self):
+        self._clients: Dict[Tuple[str, str, str], LLMClient] = {}
+
+    def get_client(self, config: LLMConfig) -> LLMClient:
+        key_hash = hashlib.sha256((config.api_key or "").encode()).hexdigest()
+        key = (config.provider, config.model, key_hash)
+        if key not in self._clients:
+            self._clients[key] = LLMClient(config)
+        return self._clients[key]
+
+
+LLM_CLIENTS = LLMClientRegistry()
+
 
 class AgentDesk:
     """Represents an agent's workspace and configuration"""
@@ -187,12 +607,14 @@ class AgentDesk:
         hierarchy_level: int = 0,
         reports_to: Optional[str] = None,
         team_id: Optional[str] = None,
-        knowledge_base: Optional[KnowledgeBase] = None
+        knowledge_base: Optional[KnowledgeBase] = None,
+        response_cache: Optional[SemanticCache] = None
     ):
         self.desk_id = desk_id
         self.title = title
         self.role = role
         self.llm_config = llm_config
+        self.llm = LLM_CLIENTS.get_client(llm_config)
         self.capabilities = capabilities or []
         self.hierarchy_level = hierarchy_level
         self.reports_to = reports_to
@@ -200,7 +622,22 @@ class AgentDesk:
         self.status = DeskStatus.IDLE
         self.memory = AgentMemory()
         self.knowledge_base = knowledge_base
+        self.response_cache = response_cache
         self.current_task: Optional[Task] = None
+        self.refresh_dict()
+
+    def refresh_dict(self):
+        """Rebuild the cached to_dict snapshot; call after changing any attribute but status"""
+        self._static_dict = {
+            "desk_id": self.desk_id,
+            "title": self.title,
+            "role": self.role.value,
+            "hierarchy_level": self.hierarchy_level,
+            "reports_to": self.reports_to,
+            "team_id": self.team_id,
+            "llm_config": self.llm_config.to_dict(),
+            "capabilities": tuple(self.capabilities)
+        }
         
     async def process_task(self, task: Task) -> Dict[str, Any]:
         """Process a task using the configured LLM"""
@@ -234,16 +671,49 @@ class AgentDesk:
     
     async def _execute_with_llm(self, task: Task) -> Dict[str, Any]:
         """Execute task with configured LLM (placeholder for actual implementation)"""
-        
+        context_str = self._retrieve_context(task)
+        system_prompt = self._build_system_prompt(task, context_str)
+
+        # Semantic cache: a near-duplicate task on this desk with the same context skips the LLM call
+        cache_query = f"{task.title}\n{task.description}"
+        cache_scope = self._cache_scope(context_str)
+        if self.response_cache:
+            cached = await asyncio.to_thread(self.response_cache.lookup, cache_query, cache_scope)
+            if cached is not None:
+                self._log_run(task, "cache_hit", cached)
+                return cached
+
+        try:
+            result = await self.llm.invoke(
+                system_prompt, task, self.llm_config.temperature, self.llm_config.max_tokens
+            )
+        except Exception as e:
+            result = {"error": f"Execution failed: {str(e)}"}
+
+        self._log_run(task, "success" if "error" not in result else "failed", result)
+
+        if self.response_cache and "error" not in result:
+            await asyncio.to_thread(self.response_cache.store, cache_query, cache_scope, result)
+
+        return result
+
+    def _retrieve_context(self, task: Task) -> str:
+        """Relevant knowledge base passages, formatted for the prompt; empty without a knowledge base"""
         # RAG: Retrieve context
-        context_str = ""
         if self.knowledge_base:
             docs = self.knowledge_base.query(task.description + " " + task.title)
             if docs:
-                context_str = "\n\nRelevant Organizational Knowledge:\n" + "\n---\n".join(docs)
+                return "\n\nRelevant Organizational Knowledge:\n" + "\n---\n".join(docs)
+        return ""
+
+    def _cache_scope(self, context_str: str) -> str:
+        """Semantic cache scope: this desk's prompt (title, role, capabilities) and the retrieved context"""
+        return f"{self.desk_id}:{hashlib.sha256(context_str.encode()).hexdigest()}"
 
+    def _build_system_prompt(self, task: Task, context_str: str) -> str:
+        """Role/task prompt plus any relevant knowledge base context"""
         # Construct prompt based on role and task
-        system_prompt = f"""You are a {self.title} in an AI organization.
+        return f"""You are a {self.title} in an AI organization.
 Your role is {self.role.value}.
 Your capabilities: {', '.join(self.capabilities)}
 
@@ -253,91 +723,56 @@ Description: {task.description}
 Priority: {task.priority.name}
 {context_str}
 """
-        
-        # MLflow Tracking
-        try:
-            mlflow.set_experiment("AgentDesk_Operations")
-            
-            with mlflow.start_run(run_name=f"task_{task.task_id}", nested=True):
-                mlflow.log_param("agent_role", self.role.value)
-                mlflow.log_param("agent_title", self.title)
-                mlflow.log_param("task_id", task.task_id)
-                mlflow.log_text(PIIMasker.mask(task.description), "task_description.txt")
-                mlflow.log_param("provider", self.llm_config.provider)
-                mlflow.log_param("model", self.llm_config.model)
-                
-                result = {}
-                # Here you would call the actual LLM API based on provider
-                if self.llm_config.provider == "anthropic":
-                    result = await self._call_anthropic(system_prompt, task)
-                elif self.llm_config.provider == "openai":
-                    result = await self._call_openai(system_prompt, task)
-                elif self.llm_config.provider == "gemini":
-                    result = await self._call_gemini(system_prompt, task)
-                else:
-                    result = {"result": "LLM integration pending"}
-                
-                mlflow.log_param("status", "success" if "error" not in result else "failed")
-                mlflow.log_text(json.dumps(result, default=str), "result.json")
-                
-                return result
-        except Exception as e:
-            # Fallback if MLflow fails (e.g. connection error)
-            print(f"MLflow logging failed: {e}")
-            # Still execute if we haven't yet
-            if 'result' not in locals():
-                 if self.llm_config.provider == "anthropic":
-                    return await self._call_anthropic(system_prompt, task)
-                 elif self.llm_config.provider == "openai":
-                    return await self._call_openai(system_prompt, task)
-                 elif self.llm_config.provider == "gemini":
-                    return await self._call_gemini(system_prompt, task)
-            return {"error": f"Execution failed: {str(e)}"}
-    
-    async def _call_anthropic(self, system_prompt: str, task: Task) -> Dict[str, Any]:
-        """Call Anthropic Claude API"""
-        # Placeholder - integrate with actual Anthropic SDK
-        # from anthropic import Anthropic
-        # client = Anthropic(api_key=self.llm_config.api_key)
-        # message = client.messages.create(...)
-        return {
-            "provider": "anthropic",
-            "model": self.llm_config.model,
-            "result": "Task completed (implementation pending)"
-        }
-    
-    async def _call_openai(self, system_prompt: str, task: Task) -> Dict[str, Any]:
-        """Call OpenAI API"""
-        # Placeholder - integrate with actual OpenAI SDK
-        return {
-            "provider": "openai",
-            "model": self.llm_config.model,
-            "result": "Task completed (implementation pending)"
-        }
 
-    async def _call_gemini(self, system_prompt: str, task: Task) -> Dict[str, Any]:
-        """Call Google Gemini API"""
-        api_key = self.llm_config.api_key or os.getenv("GEMINI_API_KEY")
-        if not api_key:
-             return {"error": "Gemini API key not found"}
+    async def stream_task(self, task: Task) -> AsyncIterator[str]:
+        """Yield the task's answer as it is generated
 
-        genai.configure(api_key=api_key)
-        
-        # Combine system prompt and task details
-        full_prompt = f"{system_prompt}\n\nTask: {task.title}\n{task.description}"
-        
-        try:
-            # Run blocking call in thread
-            model = genai.GenerativeModel(self.llm_config.model or "gemini-pro")
-            response = await asyncio.to_thread(model.generate_content, full_prompt)
-            
-            return {
-                "provider": "gemini",
+        Gemini streams chunk by chunk; other providers yield their whole result once. Both go
+        through the semantic cache: a hit is yielded whole, and a completed stream is stored.
+        """
+        if not self.llm.supports_streaming:
+            result = await self._execute_with_llm(task)
+            yield result.get("result") or result.get("error", "")
+            return
+
+        context_str = self._retrieve_context(task)
+        cache_query = f"{task.title}\n{task.description}"
+        cache_scope = self._cache_scope(context_str)
+        if self.response_cache:
+            cached = await asyncio.to_thread(self.response_cache.lookup, cache_query, cache_scope)
+            if cached is not None:
+                yield cached.get("result", "")
+                return
+
+        chunks = []
+        async for chunk in self.llm.stream(
+            self._build_system_prompt(task, context_str), task,
+            self.llm_config.temperature, self.llm_config.max_tokens
+        ):
+            chunks.append(chunk)
+            yield chunk
+
+        if self.response_cache:
+            result = {"provider": self.llm_config.provider, "model": self.llm_config.model, "result": "".join(chunks)}
+            await asyncio.to_thread(self.response_cache.store, cache_query, cache_scope, result)
+
+    def _log_run(self, task: Task, status: str, result: Dict[str, Any]):
+        """Queue the task's MLflow run; it is written after the result has been returned"""
+        queue_mlflow_run({
+            "run_name": f"task_{task.task_id}",
+            "params": {
+                "agent_role": self.role.value,
+                "agent_title": self.title,
+                "task_id": task.task_id,
+                "provider": self.llm_config.provider,
                 "model": self.llm_config.model,
-                "result": response.text
-            }
-        except Exception as e:
-            return {"error": str(e)}
+                "status": status,
+            },
+            "texts": {
+                "task_description.txt": PIIMasker.mask(task.description),
+                "result.json": json.dumps(result, default=str),
+            },
+        })
     
     def can_delegate_to(self, other_desk: 'AgentDesk') -> bool:
         """Check if this desk can delegate to another desk"""
@@ -349,20 +784,14 @@ Priority: {task.priority.name}
         return False
     
     def to_dict(self) -> Dict[str, Any]:
-        return {
-            "desk_id": self.desk_id,
-            "title": self.title,
-            "role": self.role.value,
-            "hierarchy_level": self.hierarchy_level,
-            "reports_to": self.reports_to,
-            "team_id": self.team_id,
-            "status": self.status.value,
-            "llm_config": self.llm_config.to_dict(),
-            "capabilities": self.capabilities
-        }
+        # The nested values are copied too, so callers can mutate the result freely
+        snapshot = {**self._static_dict, "status": self.status.value}
+        snapshot["llm_config"] = dict(snapshot["llm_config"])
+        snapshot["capabilities"] = list(snapshot["capabilities"])
+        return snapshot
 
 
-@dataclass
+@dataclass(slots=True)
 class Team:
     team_id: str
     name: str
@@ -371,9 +800,9 @@ class Team:
     focus: Optional[str] = None
 
     def to_dict(self) -> Dict[str, Any]:
-        return self.__dict__
+        return {name: getattr(self, name) for name in self.__slots__}
 
-@dataclass
+@dataclass(slots=True)
 class Committee:
     committee_id: str
     name: str
@@ -383,9 +812,9 @@ class Committee:
     meeting_frequency: Optional[str] = None
 
     def to_dict(self) -> Dict[str, Any]:
-        return self.__dict__
+        return {name: getattr(self, name) for name in self.__slots__}
 
-@dataclass
+@dataclass(slots=True)
 class QAPipelineStage:
     type: str
     agent: Optional[str] = None
@@ -402,9 +831,9 @@ class QAPipelineStage:
     tools: Optional[List[str]] = field(default_factory=list)
 
     def to_dict(self) -> Dict[str, Any]:
-        return self.__dict__
+        return {name: getattr(self, name) for name in self.__slots__}
 
-@dataclass
+@dataclass(slots=True)
 class QAPipeline:
     enabled: bool = True
     required_for: List[str] = field(default_factory=list)
@@ -417,7 +846,7 @@ class QAPipeline:
             "stages": [stage.to_dict() for stage in self.stages]
         }
 
-@dataclass
+@dataclass(slots=True)
 class WorkflowStep:
     name: str
     assigned_role: Optional[str] = None
@@ -436,9 +865,9 @@ class WorkflowStep:
     required_for: Optional[List[str]] = field(default_factory=list)
 
     def to_dict(self) -> Dict[str, Any]:
-        return self.__dict__
+        return {name: getattr(self, name) for name in self.__slots__}
 
-@dataclass
+@dataclass(slots=True)
 class Workflow:
     name: str
     trigger: str
@@ -453,7 +882,7 @@ class Workflow:
             "priority": self.priority
         }
 
-@dataclass
+@dataclass(slots=True)
 class TaskRoutingRule:
     keywords: List[str] = field(default_factory=list)
     route_to: Optional[str] = None
@@ -462,9 +891,9 @@ class TaskRoutingRule:
     escalate_to: Optional[str] = None
 
     def to_dict(self) -> Dict[str, Any]:
-        return self.__dict__
+        return {name: getattr(self, name) for name in self.__slots__}
 
-@dataclass
+@dataclass(slots=True)
 class NotificationChannel:
     type: str
     webhook_url: Optional[str] = None
@@ -473,18 +902,18 @@ class NotificationChannel:
     notify_on: List[str] = field(default_factory=list)
 
     def to_dict(self) -> Dict[str, Any]:
-        return self.__dict__
+        return {name: getattr(self, name) for name in self.__slots__}
 
-@dataclass
+@dataclass(slots=True)
 class MetricsDashboard:
     name: str
     metrics: List[str] = field(default_factory=list)
     refresh_interval: Optional[int] = None
 
     def to_dict(self) -> Dict[str, Any]:
-        return self.__dict__
+        return {name: getattr(self, name) for name in self.__slots__}
 
-@dataclass
+@dataclass(slots=True)
 class MetricsConfig:
     track: List[str] = field(default_factory=list)
     dashboards: List[MetricsDashboard] = field(default_factory=list)
@@ -495,7 +924,7 @@ class MetricsConfig:
             "dashboards": [dashboard.to_dict() for dashboard in self.dashboards]
         }
 
-@dataclass
+@dataclass(slots=True)
 class AgentBehavior:
     communication_style: Optional[str] = None
     decision_making: Optional[str] = None
@@ -508,28 +937,92 @@ class AgentBehavior:
     documentation_level: Optional[str] = None
 
     def to_dict(self) -> Dict[str, Any]:
-        return self.__dict__
+        return {name: getattr(self, name) for name in self.__slots__}
 
 class OrganizationStructure:
     """Manages the organizational hierarchy"""
     
-    def __init__(self, org_name: str):
+    def __init__(self, org_name: str, task_store: Optional[TaskStore] = None):
         self.org_name = org_name
         self.desks: Dict[str, AgentDesk] = {}
-        self.tasks: Dict[str, Task] = {}
+        # Shared across uvicorn workers; a per-process dict would give each worker its own tasks
+        self.task_store = task_store or TaskStore()
         self.teams: Dict[str, Team] = {}
         self.committees: Dict[str, Committee] = {}
         self.qa_pipeline: Optional[QAPipeline] = None
         self.workflows: Dict[str, Workflow] = {}
-        self.task_routing_rules: List[TaskRoutingRule] = []
+        self.task_routing_rules = []
         self.notifications: List[NotificationChannel] = []
         self.metrics: Optional[MetricsConfig] = None
         self.agent_behaviors: Dict[str, AgentBehavior] = {}
+        # reports_to desk_id -> desk_ids reporting to it, so subordinate lookups skip a full scan
+        self._subordinates: Dict[str, List[str]] = defaultdict(list)
+        # desk_id -> reporting chain; cleared whenever a desk joins, leaves or moves
+        self._chains: Dict[str, Tuple[AgentDesk, ...]] = {}
+        # Background saves and task processing; awaited by aclose before the store is closed
+        self._background: set = set()
+
+    async def __aenter__(self) -> "OrganizationStructure":
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
+
+    async def aclose(self):
+        """Finish background task work, then close the task store's database connection
+
+        Without this the store's connection thread keeps the interpreter from exiting.
+        """
+        while self._background:
+            await asyncio.gather(*self._background, return_exceptions=True)
+        await self.task_store.close()
+
+    def _in_background(self, coro):
+        job = asyncio.get_running_loop().create_task(coro)
+        self._background.add(job)
+        job.add_done_callback(self._background.discard)
+        return job
+
+    @property
+    def task_routing_rules(self) -> Tuple[TaskRoutingRule, ...]:
+        """Routing rules; assign a new sequence to change them so route() is recompiled"""
+        return self._router.rules
+
+    @task_routing_rules.setter
+    def task_routing_rules(self, rules: List[TaskRoutingRule]):
+        self._router = TaskRouter(rules)
+
+    def route(self, description: str) -> Optional[str]:
+        """route_to of the first rule with a keyword in the description, in one scan"""
+        return self._router.route(description)
 
-        
     def add_desk(self, desk: AgentDesk):
         """Add an agent desk to the organization"""
+        if desk.desk_id in self.desks:
+            self.remove_desk(desk.desk_id)
         self.desks[desk.desk_id] = desk
+        if desk.reports_to:
+            self._subordinates[desk.reports_to].append(desk.desk_id)
+        self._chains.clear()
+
+    def remove_desk(self, desk_id: str) -> Optional[AgentDesk]:
+        """Remove a desk; desks that reported to it keep their reports_to"""
+        desk = self.desks.pop(desk_id, None)
+        if desk and desk.reports_to:
+            self._subordinates[desk.reports_to].remove(desk_id)
+        self._chains.clear()
+        return desk
+
+    def move_desk(self, desk_id: str, reports_to: Optional[str]):
+        """Change who a desk reports to, keeping the subordinate index in step"""
+        desk = self.desks[desk_id]
+        if desk.reports_to:
+            self._subordinates[desk.reports_to].remove(desk_id)
+        desk.reports_to = reports_to
+        desk.refresh_dict()
+        if reports_to:
+            self._subordinates[reports_to].append(desk_id)
+        self._chains.clear()
         
     def get_desk(self, desk_id: str) -> Optional[AgentDesk]:
         """Get a desk by ID"""
@@ -537,23 +1030,28 @@ class OrganizationStructure:
     
     def get_subordinates(self, desk_id: str) -> List[AgentDesk]:
         """Get all desks that report to this desk"""
-        return [
-            desk for desk in self.desks.values()
-            if desk.reports_to == desk_id
-        ]
+        return [self.desks[d] for d in self._subordinates.get(desk_id, ())]
     
     def get_hierarchy_chain(self, desk_id: str) -> List[AgentDesk]:
         """Get the reporting chain from desk to top"""
+        cached = self._chains.get(desk_id)
+        if cached is not None:
+            return list(cached)
+
         chain = []
+        visited = set()
         current_desk = self.get_desk(desk_id)
         
-        while current_desk:
+        # A reports_to cycle would otherwise loop forever; the chain stops where it repeats
+        while current_desk and current_desk.desk_id not in visited:
+            visited.add(current_desk.desk_id)
             chain.append(current_desk)
             if current_desk.reports_to:
                 current_desk = self.get_desk(current_desk.reports_to)
             else:
                 break
         
+        self._chains[desk_id] = tuple(chain)
         return chain
     
     async def delegate_task(self, task: Task, from_desk_id: str, to_desk_id: str) -> bool:
@@ -568,12 +1066,54 @@ class OrganizationStructure:
             return False
         
         task.assigned_to = to_desk_id
-        self.tasks[task.task_id] = task
+        await self.task_store.save_task(task)
         
         # Process the task asynchronously
-        asyncio.create_task(to_desk.process_task(task))
+        self._in_background(self._process_and_save(to_desk, task))
         return True
+
+    async def _process_and_save(self, desk: AgentDesk, task: Task) -> Dict[str, Any]:
+        result = await desk.process_task(task)
+        await self.task_store.save_task(task)
+        return result
     
+    async def delegate_tasks_batch(
+        self,
+        assignments: List[tuple],
+        max_concurrency: int = 10,
+        rate_limit: int = 100,
+        progress_callback=None
+    ) -> Dict[str, Dict[str, Any]]:
+        """Delegate and process many (task, from_desk_id, to_desk_id) assignments together
+
+        Assignments that fail the delegation rules are skipped. The rest are grouped by
+        (provider, model) so each provider's budget is paced separately, and every group
+        runs concurrently. Returns results keyed by task_id.
+        """
+        groups: Dict[tuple, list] = {}
+        for task, from_desk_id, to_desk_id in assignments:
+            from_desk = self.get_desk(from_desk_id)
+            to_desk = self.get_desk(to_desk_id)
+            if not from_desk or not to_desk or not from_desk.can_delegate_to(to_desk):
+                continue
+            task.assigned_to = to_desk_id
+            await self.task_store.save_task(task)
+            key = (to_desk.llm_config.provider, to_desk.llm_config.model)
+            groups.setdefault(key, []).append((to_desk, task))
+
+        group_results = await asyncio.gather(*(
+            BatchProcessor(
+                max_concurrency=max_concurrency,
+                rate_limit=rate_limit,
+                progress_callback=progress_callback
+            ).run(jobs)
+            for jobs in groups.values()
+        ))
+        for jobs in groups.values():
+            for _, task in jobs:
+                await self.task_store.save_task(task)
+        return {task_id: result for results in group_results for task_id, result in results.items()}
+
     def create_task(
         self,
         title: str,
@@ -582,8 +1122,13 @@ class OrganizationStructure:
         priority: Priority = Priority.MEDIUM,
         qa_required: bool = True
     ) -> Task:
-        """Create a new task"""
-        task_id = f"task_{len(self.tasks) + 1:04d}"
+        """Create a new task
+
+        Stays synchronous: the task is cached at once and saved to the store in the background
+        when an event loop is running. Called outside one, it is only cached until it is
+        delegated or passed to save_task.
+        """
+        task_id = f"task_{new_task_id()}"
         task = Task(
             task_id=task_id,
             title=title,
@@ -592,7 +1137,28 @@ class OrganizationStructure:
             priority=priority,
             qa_required=qa_required
         )
-        self.tasks[task_id] = task
+        self.task_store.cache(task)
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            # No running event loop to save from
+            return task
+        self._in_background(self.task_store.save_task(task))
+        return task
+
+    async def save_task(self, task: Task):
+        """Persist a task so every worker sharing the store can load it"""
+        await self.task_store.save_task(task)
+
+    async def get_task(self, task_id: str) -> Optional[Task]:
+        """Get a task by ID, from the in-process LRU when possible"""
+        task = self.task_store.cached(task_id)
+        if task is None:
+            data = await self.task_store.load_task(task_id)
+            if data is None:
+                return None
+            task = Task.from_dict(data)
+            self.task_store.cache(task)
         return task
     
     def get_org_chart(self) -> Dict[str, Any]:
@@ -620,77 +1186,95 @@ class OrganizationStructure:
 async def example_usage():
     """Demonstrate basic usage"""
     
-    # Create organization
-    org = OrganizationStructure("AI Development Team")
+    # Create organization; leaving the block waits for background work and closes its task store
+    async with OrganizationStructure("AI Development Team") as org:
     
-    # Create CTO desk
-    cto_desk = AgentDesk(
-        desk_id="cto-001",
-        title="Chief Technology Officer",
-        role=AgentRole.EXECUTIVE,
-        llm_config=LLMConfig(
-            provider="anthropic",
-            model="claude-sonnet-4-20250514",
-            temperature=0.7
-        ),
-        capabilities=["strategic_planning", "architecture_design", "team_coordination"],
-        hierarchy_level=1
-    )
-    org.add_desk(cto_desk)
+        # Create CTO desk
+        cto_desk = AgentDesk(
+            desk_id="cto-001",
+            title="Chief Technology Officer",
+            role=AgentRole.EXECUTIVE,
+            llm_config=LLMConfig(
+                provider="anthropic",
+                model="claude-sonnet-4-20250514",
+                temperature=0.7
+            ),
+            capabilities=["strategic_planning", "architecture_design", "team_coordination"],
+            hierarchy_level=1
+        )
+        org.add_desk(cto_desk)
     
-    # Create Senior Engineer desk
-    senior_dev_desk = AgentDesk(
-        desk_id="dev-senior-001",
-        title="Senior Software Engineer",
-        role=AgentRole.SENIOR_ENGINEER,
-        llm_config=LLMConfig(
-            provider="anthropic",
-            model="claude-sonnet-4-20250514",
-            temperature=0.3
-        ),
-        capabilities=["code_generation", "code_review", "debugging", "documentation"],
-        hierarchy_level=2,
-        reports_to="cto-001",
-        team_id="backend-team"
-    )
-    org.add_desk(senior_dev_desk)
+        # Create Senior Engineer desk
+        senior_dev_desk = AgentDesk(
+            desk_id="dev-senior-001",
+            title="Senior Software Engineer",
+            role=AgentRole.SENIOR_ENGINEER,
+            llm_config=LLMConfig(
+                provider="anthropic",
+                model="claude-sonnet-4-20250514",
+                temperature=0.3
+            ),
+            capabilities=["code_generation", "code_review", "debugging", "documentation"],
+            hierarchy_level=2,
+            reports_to="cto-001",
+            team_id="backend-team"
+        )
+        org.add_desk(senior_dev_desk)
     
-    # Create QA Engineer desk
-    qa_desk = AgentDesk(
-        desk_id="qa-001",
-        title="QA Engineer",
-        role=AgentRole.QA_ENGINEER,
-        llm_config=LLMConfig(
-            provider="openai",
-            model="gpt-4",
-            temperature=0.2
-        ),
-        capabilities=["testing", "quality_assurance", "test_automation"],
-        hierarchy_level=2,
-        reports_to="cto-001",
-        team_id="qa-team"
-    )
-    org.add_desk(qa_desk)
+        # Create QA Engineer desk
+        qa_desk = AgentDesk(
+            desk_id="qa-001",
+            title="QA Engineer",
+            role=AgentRole.QA_ENGINEER,
+            llm_config=LLMConfig(
+                provider="openai",
+                model="gpt-4",
+                temperature=0.2
+            ),
+            capabilities=["testing", "quality_assurance", "test_automation"],
+            hierarchy_level=2,
+            reports_to="cto-001",
+            team_id="qa-team"
+        )
+        org.add_desk(qa_desk)
     
-    # Create a task
-    task = org.create_task(
-        title="Implement user authentication",
-        description="Create a secure authentication system with JWT tokens",
-        created_by="user-001",
-        priority=Priority.HIGH,
-        qa_required=True
-    )
+        # Create a task
+        task = org.create_task(
+            title="Implement user authentication",
+            description="Create a secure authentication system with JWT tokens",
+            created_by="user-001",
+            priority=Priority.HIGH,
+            qa_required=True
+        )
     
-    # CTO delegates to senior developer
-    await org.delegate_task(task, "cto-001", "dev-senior-001")
+        # CTO delegates to senior developer
+        await org.delegate_task(task, "cto-001", "dev-senior-001")
     
-    # Print org chart
-    print(json.dumps(org.get_org_chart(), indent=2))
+        # Print org chart
+        print(orjson.dumps(org.get_org_chart(), option=orjson.OPT_INDENT_2).decode())
     
-    # Wait for task processing
-    await asyncio.sleep(2)
+        # Wait for task processing
+        await asyncio.sleep(2)
     
-    print(f"\nTask Status: {task.status.value}")
+        print(f"\nTask Status: {task.status.value}")
+
+        # Hand a batch of follow-up work to the QA desk in one call
+        follow_ups = [
+            org.create_task(title=title, description=description, created_by="user-001")
+            for title, description in [
+                ("Write auth unit tests", "Cover login, logout and token refresh"),
+                ("Review auth threat model", "Check token storage and session expiry"),
+            ]
+        ]
+        results = await org.delegate_tasks_batch(
+            [(t, "cto-001", "qa-001") for t in follow_ups],
+            progress_callback=lambda done, total: print(f"Batch progress: {done}/{total}")
+        )
+        print(f"Batch results: {len(results)} tasks processed")
+
+    # Let the background worker finish writing MLflow runs before the loop closes
+    await flush_mlflow_runs()
+    await close_provider_http_client()
 
 
 if __name__ == "__main__":
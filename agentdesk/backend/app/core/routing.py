@@ -0,0 +1,45 @@
+"""
+Task routing for AgentDesk
+Every rule's keywords compiled into one pattern, so classifying a task is a single scan
+"""
+
+import re
+from typing import Any, Dict, Optional, Sequence
+
+
+class TaskRouter:
+    """Routes a task description to the route_to of the first rule with a matching keyword
+
+    Rules are anything with ``keywords`` and ``route_to`` attributes (TaskRoutingRule).
+    Matching is case-insensitive substring matching, as with ``keyword in description``.
+    """
+
+    def __init__(self, rules: Sequence[Any]):
+        self.rules = tuple(rules)
+        # keyword -> index of the first rule that lists it
+        self._rule_index: Dict[str, int] = {}
+        for index, rule in enumerate(self.rules):
+            for keyword in rule.keywords:
+                if keyword:
+                    self._rule_index.setdefault(keyword.lower(), index)
+        self._pattern: Optional[re.Pattern] = None
+        if self._rule_index:
+            # Alternatives ordered by rule so the lookahead reports the earliest rule matching
+            # at each position, including keywords that overlap a longer one
+            keywords = sorted(self._rule_index, key=lambda kw: (self._rule_index[kw], -len(kw)))
+            self._pattern = re.compile(
+                "(?=(" + "|".join(re.escape(kw) for kw in keywords) + "))", re.IGNORECASE
+            )
+
+    def route(self, description: str) -> Optional[str]:
+        """route_to of the first matching rule, or None when no keyword occurs"""
+        if self._pattern is None:
+            return None
+        matched = [
+            index
+            for match in self._pattern.finditer(description)
+            if (index := self._rule_index.get(match.group(1).lower())) is not None
+        ]
+        if not matched:
+            return None
+        return self.rules[min(matched)].route_to
@@ -0,0 +1,104 @@
+"""
+Persistent task store for AgentDesk
+SQLite-backed so every uvicorn worker sees the same tasks, with a small LRU in front for hot reads
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+import aiosqlite
+import orjson
+
+# In-memory unless configured; point every worker at the same file to share tasks between them
+TASK_DB_PATH = os.getenv("AGENTDESK_TASK_DB") or ":memory:"
+
+_CROCKFORD = "0123456789ABCDEFGHJKMNPQRSTVWXYZ"
+_last_id_value = 0
+_id_lock = threading.Lock()
+
+
+def new_task_id() -> str:
+    """ULID: 48-bit millisecond timestamp then 80 random bits, so ids sort by creation time
+    and never collide across workers the way a per-process counter does
+
+    Monotonic within a process: ids minted in the same millisecond increment the previous one.
+    """
+    global _last_id_value
+    value = (time.time_ns() // 1_000_000) << 80 | int.from_bytes(os.urandom(10), "big")
+    with _id_lock:
+        if value <= _last_id_value:
+            value = _last_id_value + 1
+        _last_id_value = value
+    return "".join(_CROCKFORD[(value >> shift) & 31] for shift in range(125, -1, -5))
+
+
+class TaskStore:
+    """Tasks persisted as orjson documents; reads go through an in-process LRU first"""
+
+    def __init__(self, path: str = TASK_DB_PATH, cache_size: int = 1024):
+        self.path = path
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[str, Any]" = OrderedDict()
+        self._db: Optional[aiosqlite.Connection] = None
+
+    async def _connect(self) -> aiosqlite.Connection:
+        if self._db is None:
+            db = await aiosqlite.connect(self.path)
+            # WAL lets other workers read while one writes; busy_timeout waits out their writes
+            await db.execute("PRAGMA journal_mode=WAL")
+            await db.execute("PRAGMA busy_timeout=5000")
+            await db.execute(
+                "CREATE TABLE IF NOT EXISTS tasks ("
+                "task_id TEXT PRIMARY KEY, status TEXT NOT NULL, data BLOB NOT NULL)"
+            )
+            await db.commit()
+            self._db = db
+        return self._db
+
+    def cache(self, task):
+        """Remember a task in the LRU without touching the database"""
+        self._cache[task.task_id] = task
+        self._cache.move_to_end(task.task_id)
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def cached(self, task_id: str):
+        task = self._cache.get(task_id)
+        if task is not None:
+            self._cache.move_to_end(task_id)
+        return task
+
+    async def save_task(self, task):
+        """Insert or replace a task; orjson encodes the dataclass, enums and datetimes natively"""
+        self.cache(task)
+        db = await self._connect()
+        await db.execute(
+            "INSERT OR REPLACE INTO tasks (task_id, status, data) VALUES (?, ?, ?)",
+            (task.task_id, task.status.value, orjson.dumps(task))
+        )
+        await db.commit()
+
+    async def load_task(self, task_id: str) -> Optional[Dict[str, Any]]:
+        """Stored fields of a task, or None if no worker has saved it"""
+        db = await self._connect()
+        async with db.execute("SELECT data FROM tasks WHERE task_id = ?", (task_id,)) as cursor:
+            row = await cursor.fetchone()
+        return orjson.loads(row[0]) if row else None
+
+    async def list_tasks(self, status: Optional[str] = None, limit: int = 100) -> List[Dict[str, Any]]:
+        """Stored tasks oldest first (ULIDs sort by creation time), optionally filtered by status"""
+        db = await self._connect()
+        if status is None:
+            query, params = "SELECT data FROM tasks ORDER BY task_id LIMIT ?", (limit,)
+        else:
+            query, params = "SELECT data FROM tasks WHERE status = ? ORDER BY task_id LIMIT ?", (status, limit)
+        async with db.execute(query, params) as cursor:
+            return [orjson.loads(row[0]) async for row in cursor]
+
+    async def close(self):
+        if self._db is not None:
+            await self._db.close()
+            self._db = None
@@ -1,43 +1,252 @@
-from sqlalchemy.orm import Session
+import datetime
+from itertools import islice
+from typing import AsyncIterable, AsyncIterator, Iterable, Iterator, List, Optional, Sequence, Union
+
+from cachetools import TTLCache
+from sqlalchemy import func, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload, raiseload, selectinload
+from sqlalchemy.orm.attributes import set_committed_value
 from .database import models
 from . import schemas
 
-def get_agent(db: Session, agent_id: int):
-    return db.query(models.Agent).filter(models.Agent.id == agent_id).first()
+# Rows per multi-VALUES INSERT in the bulk create_* helpers
+BULK_INSERT_BATCH_SIZE = 1000
+
+# Any relationship not eager-loaded by a list query raises instead of issuing one SELECT per row
+_LIST_LOAD_GUARD = (raiseload("*"),)
+
+# Column order expected for each tuple passed to copy_cost_tracking; id and meta_data use server defaults
+COST_TRACKING_COPY_COLUMNS = (
+    "organization_id", "desk_id", "task_id", "session_id", "provider", "model",
+    "input_tokens", "output_tokens", "total_tokens", "input_cost", "output_cost", "total_cost",
+    "created_at", "billing_month",
+)
+
+# Rows fetched per server-side cursor round trip when streaming exports
+STREAM_BATCH_SIZE = 500
+
+# Agents and knowledge bases change far less often than they are read, so point lookups are
+# served from a short-lived per-process cache; create_* helpers invalidate affected entries.
+# Entries are validated schema snapshots, never ORM instances, so nothing bound to one session
+# leaks into another; writes from other workers show up once the TTL expires
+POINT_LOOKUP_CACHE_SIZE = 4096
+POINT_LOOKUP_CACHE_TTL = 60
+_agent_cache = TTLCache(maxsize=POINT_LOOKUP_CACHE_SIZE, ttl=POINT_LOOKUP_CACHE_TTL)
+_knowledge_base_cache = TTLCache(maxsize=POINT_LOOKUP_CACHE_SIZE, ttl=POINT_LOOKUP_CACHE_TTL)
+_data_source_cache = TTLCache(maxsize=POINT_LOOKUP_CACHE_SIZE, ttl=POINT_LOOKUP_CACHE_TTL)
+
+def _batched(items: Iterable, size: int) -> Iterator[list]:
+    iterator = iter(items)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+async def get_agent(db: AsyncSession, agent_id: int):
+    if agent_id in _agent_cache:
+        return _agent_cache[agent_id]
+    # A single parent row is fetched with its versions in one LEFT JOIN round trip instead of selectin's two
+    stmt = select(models.Agent).options(joinedload(models.Agent.versions)).where(models.Agent.id == agent_id)
+    db_agent = (await db.execute(stmt)).unique().scalar_one_or_none()
+    if db_agent is None:
+        return None
+    agent = _agent_cache[agent_id] = schemas.Agent.model_validate(db_agent, from_attributes=True)
+    return agent
+
+async def get_agents_by_ids(db: AsyncSession, ids: Iterable[int]) -> List[schemas.Agent]:
+    """Fetch many agents in one round trip; cached agents are not re-read. Unknown ids are skipped."""
+    ids = list(dict.fromkeys(ids))
+    found = {agent_id: _agent_cache[agent_id] for agent_id in ids if agent_id in _agent_cache}
+    missing = [agent_id for agent_id in ids if agent_id not in found]
+    if missing:
+        stmt = select(models.Agent).options(selectinload(models.Agent.versions)).where(models.Agent.id.in_(missing))
+        for db_agent in (await db.scalars(stmt)).all():
+            found[db_agent.id] = _agent_cache[db_agent.id] = schemas.Agent.model_validate(
+                db_agent, from_attributes=True
+            )
+    return [found[agent_id] for agent_id in ids if agent_id in found]
+
+async def get_agents(db: AsyncSession, after_id: Optional[int] = None, limit: int = 100):
+    stmt = (
+        select(models.Agent)
+        .options(selectinload(models.Agent.versions), *_LIST_LOAD_GUARD)
+        .order_by(models.Agent.id)
+        .limit(limit)
+    )
+    if after_id is not None:
+        stmt = stmt.where(models.Agent.id > after_id)
+    return (await db.scalars(stmt)).all()
 
-def get_agents(db: Session, skip: int = 0, limit: int = 100):
-    return db.query(models.Agent).offset(skip).limit(limit).all()
+async def stream_agents(db: AsyncSession, batch_size: int = STREAM_BATCH_SIZE) -> AsyncIterator[models.Agent]:
+    """Yield every agent from a server-side cursor, holding at most one batch in memory."""
+    stmt = (
+        select(models.Agent)
+        .options(selectinload(models.Agent.versions))
+        .order_by(models.Agent.id)
+        .execution_options(yield_per=batch_size)
+    )
+    async for db_agent in await db.stream_scalars(stmt):
+        yield db_agent
 
-def create_agent(db: Session, agent: schemas.AgentCreate):
-    db_agent = models.Agent(name=agent.name, description=agent.description)
-    db.add(db_agent)
-    db.commit()
-    db.refresh(db_agent)
+async def list_agents_summary(db: AsyncSession, after_id: Optional[int] = None, limit: int = 100):
+    """Return lightweight (id, name) rows for listings, without hydrating ORM objects."""
+    stmt = select(models.Agent.id, models.Agent.name).order_by(models.Agent.id).limit(limit)
+    if after_id is not None:
+        stmt = stmt.where(models.Agent.id > after_id)
+    return (await db.execute(stmt)).all()
+
+async def create_agent(db: AsyncSession, agent: schemas.AgentCreate):
+    # INSERT ... RETURNING hands back the full row, defaults included, in one round trip
+    result = await db.execute(insert(models.Agent).values(**agent.model_dump()).returning(models.Agent))
+    db_agent = result.scalar_one()
+    # A new agent has no versions; marking the collection loaded avoids a lazy load when serialized
+    set_committed_value(db_agent, "versions", [])
+    await db.commit()
     return db_agent
 
-def get_knowledge_base(db: Session, kb_id: int):
-    return db.query(models.KnowledgeBase).filter(models.KnowledgeBase.id == kb_id).first()
+async def create_agents_bulk(
+    db: AsyncSession, agents: Iterable[schemas.AgentCreate], batch_size: int = BULK_INSERT_BATCH_SIZE
+) -> List[int]:
+    """Insert many agents with one INSERT ... RETURNING per batch and a single commit."""
+    ids = []
+    for chunk in _batched(agents, batch_size):
+        result = await db.execute(insert(models.Agent).returning(models.Agent.id), [a.model_dump() for a in chunk])
+        ids.extend(result.scalars().all())
+    await db.commit()
+    return ids
+
+async def get_stats(db: AsyncSession):
+    """Row counts for the dashboard, gathered as scalar subqueries in one round trip."""
+    stmt = select(
+        select(func.count()).select_from(models.Agent).scalar_subquery().label("agents"),
+        select(func.count()).select_from(models.KnowledgeBase).scalar_subquery().label("knowledge_bases"),
+        select(func.count()).select_from(models.DataSource).scalar_subquery().label("data_sources"),
+    )
+    return (await db.execute(stmt)).one()
+
+async def get_knowledge_base(db: AsyncSession, kb_id: int):
+    if kb_id in _knowledge_base_cache:
+        return _knowledge_base_cache[kb_id]
+    stmt = (
+        select(models.KnowledgeBase)
+        .options(joinedload(models.KnowledgeBase.datasources))
+        .where(models.KnowledgeBase.id == kb_id)
+    )
+    db_kb = (await db.execute(stmt)).unique().scalar_one_or_none()
+    if db_kb is None:
+        return None
+    kb = _knowledge_base_cache[kb_id] = schemas.KnowledgeBase.model_validate(db_kb, from_attributes=True)
+    return kb
 
-def get_knowledge_bases(db: Session, skip: int = 0, limit: int = 100):
-    return db.query(models.KnowledgeBase).offset(skip).limit(limit).all()
+async def get_knowledge_bases(db: AsyncSession, after_id: Optional[int] = None, limit: int = 100):
+    stmt = (
+        select(models.KnowledgeBase)
+        .options(selectinload(models.KnowledgeBase.datasources), *_LIST_LOAD_GUARD)
+        .order_by(models.KnowledgeBase.id)
+        .limit(limit)
+    )
+    if after_id is not None:
+        stmt = stmt.where(models.KnowledgeBase.id > after_id)
+    return (await db.scalars(stmt)).all()
 
-def create_knowledge_base(db: Session, kb: schemas.KnowledgeBaseCreate):
-    db_kb = models.KnowledgeBase(name=kb.name, description=kb.description)
-    db.add(db_kb)
-    db.commit()
-    db.refresh(db_kb)
+async def create_knowledge_base(db: AsyncSession, kb: schemas.KnowledgeBaseCreate):
+    result = await db.execute(insert(models.KnowledgeBase).values(**kb.model_dump()).returning(models.KnowledgeBase))
+    db_kb = result.scalar_one()
+    set_committed_value(db_kb, "datasources", [])
+    await db.commit()
     return db_kb
 
-def get_data_source(db: Session, ds_id: int):
-    return db.query(models.DataSource).filter(models.DataSource.id == ds_id).first()
+async def create_knowledge_bases_bulk(
+    db: AsyncSession, kbs: Iterable[schemas.KnowledgeBaseCreate], batch_size: int = BULK_INSERT_BATCH_SIZE
+) -> List[int]:
+    """Insert many knowledge bases with one INSERT ... RETURNING per batch and a single commit."""
+    ids = []
+    for chunk in _batched(kbs, batch_size):
+        result = await db.execute(
+            insert(models.KnowledgeBase).returning(models.KnowledgeBase.id), [kb.model_dump() for kb in chunk]
+        )
+        ids.extend(result.scalars().all())
+    await db.commit()
+    return ids
+
+async def stream_knowledge_bases(
+    db: AsyncSession, batch_size: int = STREAM_BATCH_SIZE
+) -> AsyncIterator[models.KnowledgeBase]:
+    """Yield every knowledge base from a server-side cursor, holding at most one batch in memory."""
+    stmt = (
+        select(models.KnowledgeBase)
+        .options(selectinload(models.KnowledgeBase.datasources))
+        .order_by(models.KnowledgeBase.id)
+        .execution_options(yield_per=batch_size)
+    )
+    async for db_kb in await db.stream_scalars(stmt):
+        yield db_kb
+
+async def get_data_source(db: AsyncSession, ds_id: int):
+    if ds_id in _data_source_cache:
+        return _data_source_cache[ds_id]
+    db_ds = await db.scalar(select(models.DataSource).where(models.DataSource.id == ds_id))
+    if db_ds is None:
+        return None
+    ds = _data_source_cache[ds_id] = schemas.DataSource.model_validate(db_ds, from_attributes=True)
+    return ds
 
-def get_data_sources(db: Session, skip: int = 0, limit: int = 100):
-    return db.query(models.DataSource).offset(skip).limit(limit).all()
+async def get_data_sources(db: AsyncSession, after_id: Optional[int] = None, limit: int = 100):
+    stmt = select(models.DataSource).options(*_LIST_LOAD_GUARD).order_by(models.DataSource.id).limit(limit)
+    if after_id is not None:
+        stmt = stmt.where(models.DataSource.id > after_id)
+    return (await db.scalars(stmt)).all()
 
-def create_data_source(db: Session, ds: schemas.DataSourceCreate, kb_id: int):
-    db_ds = models.DataSource(**ds.dict(), knowledge_base_id=kb_id)
-    db.add(db_ds)
-    db.commit()
-    db.refresh(db_ds)
+async def stream_data_sources(db: AsyncSession, batch_size: int = STREAM_BATCH_SIZE) -> AsyncIterator[models.DataSource]:
+    """Yield every data source from a server-side cursor, holding at most one batch in memory."""
+    stmt = select(models.DataSource).order_by(models.DataSource.id).execution_options(yield_per=batch_size)
+    async for db_ds in await db.stream_scalars(stmt):
+        yield db_ds
+
+async def create_data_source(db: AsyncSession, ds: schemas.DataSourceCreate, kb_id: int):
+    stmt = insert(models.DataSource).values(**ds.model_dump(), knowledge_base_id=kb_id).returning(models.DataSource)
+    db_ds = (await db.execute(stmt)).scalar_one()
+    await db.commit()
+    # The cached knowledge base carries a stale datasources collection
+    _knowledge_base_cache.pop(kb_id, None)
     return db_ds
 
+async def create_data_sources_bulk(
+    db: AsyncSession, dss: Iterable[schemas.DataSourceCreate], kb_id: int, batch_size: int = BULK_INSERT_BATCH_SIZE
+) -> List[int]:
+    """Insert many data sources for a knowledge base with one INSERT ... RETURNING per batch."""
+    ids = []
+    for chunk in _batched(dss, batch_size):
+        rows = [{**ds.model_dump(), "knowledge_base_id": kb_id} for ds in chunk]
+        result = await db.execute(insert(models.DataSource).returning(models.DataSource.id), rows)
+        ids.extend(result.scalars().all())
+    await db.commit()
+    _knowledge_base_cache.pop(kb_id, None)
+    return ids
+
+def cost_tracking_row(organization_id, record: schemas.CostTrackingRecord) -> tuple:
+    """A cost_tracking tuple in COST_TRACKING_COPY_COLUMNS order, with totals and billing month filled in"""
+    created_at = record.created_at
+    if created_at.tzinfo is None:
+        created_at = created_at.replace(tzinfo=datetime.timezone.utc)
+    return (
+        organization_id, record.desk_id, record.task_id, record.session_id, record.provider, record.model,
+        record.input_tokens, record.output_tokens, record.input_tokens + record.output_tokens,
+        record.input_cost, record.output_cost, record.input_cost + record.output_cost,
+        created_at, f"{created_at.astimezone(datetime.timezone.utc):%Y-%m}",
+    )
+
+async def copy_cost_tracking(
+    db: AsyncSession, rows: Union[Iterable[Sequence], AsyncIterable[Sequence]]
+) -> None:
+    """Load cost_tracking rows with a single binary COPY FROM STDIN.
+
+    ``rows`` is consumed lazily, so a generator streams into Postgres without being buffered.
+    Tuples must follow COST_TRACKING_COPY_COLUMNS. Requires the asyncpg driver.
+    """
+    # Going through the session keeps the tenant context set in its after_begin hook
+    connection = await db.connection()
+    raw_connection = await connection.get_raw_connection()
+    await raw_connection.driver_connection.copy_records_to_table(
+        "cost_tracking", columns=COST_TRACKING_COPY_COLUMNS, records=rows
+    )
+    await db.commit()
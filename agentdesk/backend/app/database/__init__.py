@@ -1,2 +1,2 @@
-from .database import engine, SessionLocal
+from .database import engine, SessionLocal, check_database_health, set_organization_context
 from . import models
@@ -16,6 +16,9 @@ CREATE EXTENSION IF NOT EXISTS pgcrypto;
 -- Enable uuid-ossp for UUID generation
 CREATE EXTENSION IF NOT EXISTS "uuid-ossp";
 
+-- Enable ltree for desk hierarchy paths
+CREATE EXTENSION IF NOT EXISTS ltree;
+
 -- ============================================================================
 -- Custom Functions
 -- ============================================================================
@@ -41,27 +44,45 @@ END;
 $$ LANGUAGE plpgsql;
 
 -- Function to update hierarchy path when desk hierarchy changes
+-- ltree labels only allow [A-Za-z0-9_], so other characters in desk_id become '_'
 CREATE OR REPLACE FUNCTION update_desk_hierarchy_path()
 RETURNS TRIGGER AS $$
 DECLARE
-    parent_path TEXT;
+    parent_path LTREE;
+    desk_label LTREE;
 BEGIN
+    desk_label = text2ltree(regexp_replace(NEW.desk_id, '[^A-Za-z0-9_]', '_', 'g'));
     IF NEW.reports_to_id IS NULL THEN
         -- Top level desk
-        NEW.hierarchy_path = NEW.desk_id;
+        NEW.hierarchy_path = desk_label;
         NEW.hierarchy_level = 1;
     ELSE
         -- Get parent's path and level
         SELECT hierarchy_path, hierarchy_level INTO parent_path, NEW.hierarchy_level
         FROM desks WHERE id = NEW.reports_to_id;
 
-        NEW.hierarchy_path = parent_path || '/' || NEW.desk_id;
+        NEW.hierarchy_path = parent_path || desk_label;
         NEW.hierarchy_level = NEW.hierarchy_level + 1;
     END IF;
     RETURN NEW;
 END;
 $$ LANGUAGE plpgsql;
 
+-- Function to re-root a moved desk's subtree; one GiST-indexed <@ scan finds every descendant
+CREATE OR REPLACE FUNCTION update_desk_subtree_paths()
+RETURNS TRIGGER AS $$
+BEGIN
+    UPDATE desks
+    SET hierarchy_path = NEW.hierarchy_path || subpath(hierarchy_path, nlevel(OLD.hierarchy_path)),
+        hierarchy_level = NEW.hierarchy_level + nlevel(hierarchy_path) - nlevel(OLD.hierarchy_path)
+    WHERE hierarchy_path <@ OLD.hierarchy_path
+      -- Paths are built from desk_id, which is only unique per organization
+      AND organization_id = NEW.organization_id
+      AND id <> NEW.id;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
 -- Function to track cost in cost_tracking table from agent_sessions
 CREATE OR REPLACE FUNCTION track_session_cost()
 RETURNS TRIGGER AS $$
@@ -80,7 +101,6 @@ BEGIN
 
         -- Insert cost tracking record
         INSERT INTO cost_tracking (
-            id,
             organization_id,
             desk_id,
             task_id,
@@ -95,7 +115,6 @@ BEGIN
             created_at
         )
         SELECT
-            uuid_generate_v4(),
             desk_org_id,
             NEW.desk_id,
             NEW.task_id,
@@ -115,6 +134,25 @@ BEGIN
 END;
 $$ LANGUAGE plpgsql;
 
+-- Function to fold newly inserted cost_tracking rows into cost_tracking_monthly.
+-- Statement-level over the transition table, so a bulk COPY costs one upsert per
+-- organization and month rather than one per row. Runs as the owner so the rollup
+-- is maintained whatever app.current_org_id the inserting session has set.
+CREATE OR REPLACE FUNCTION rollup_cost_tracking_monthly()
+RETURNS TRIGGER AS $$
+BEGIN
+    INSERT INTO cost_tracking_monthly (organization_id, billing_month, request_count, total_tokens, total_cost)
+    SELECT organization_id, billing_month, COUNT(*), COALESCE(SUM(total_tokens), 0), COALESCE(SUM(total_cost), 0)
+    FROM new_rows
+    GROUP BY organization_id, billing_month
+    ON CONFLICT (organization_id, billing_month) DO UPDATE
+    SET request_count = cost_tracking_monthly.request_count + EXCLUDED.request_count,
+        total_tokens = cost_tracking_monthly.total_tokens + EXCLUDED.total_tokens,
+        total_cost = cost_tracking_monthly.total_cost + EXCLUDED.total_cost;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
 -- ============================================================================
 -- Triggers
 -- ============================================================================
@@ -182,6 +220,13 @@ CREATE TRIGGER trigger_desk_hierarchy
     FOR EACH ROW
     EXECUTE FUNCTION update_desk_hierarchy_path();
 
+DROP TRIGGER IF EXISTS trigger_desk_subtree ON desks;
+CREATE TRIGGER trigger_desk_subtree
+    AFTER UPDATE OF reports_to_id ON desks
+    FOR EACH ROW
+    WHEN (OLD.hierarchy_path IS DISTINCT FROM NEW.hierarchy_path)
+    EXECUTE FUNCTION update_desk_subtree_paths();
+
 -- Trigger to track session costs
 DROP TRIGGER IF EXISTS trigger_track_session_cost ON agent_sessions;
 CREATE TRIGGER trigger_track_session_cost
@@ -189,6 +234,14 @@ CREATE TRIGGER trigger_track_session_cost
     FOR EACH ROW
     EXECUTE FUNCTION track_session_cost();
 
+-- Trigger to keep the monthly cost rollup current
+DROP TRIGGER IF EXISTS trigger_cost_rollup ON cost_tracking;
+CREATE TRIGGER trigger_cost_rollup
+    AFTER INSERT ON cost_tracking
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION rollup_cost_tracking_monthly();
+
 -- ============================================================================
 -- Row-Level Security (RLS) Policies
 -- ============================================================================
@@ -228,6 +281,11 @@ DROP POLICY IF EXISTS cost_org_isolation ON cost_tracking;
 CREATE POLICY cost_org_isolation ON cost_tracking
     USING (organization_id = current_setting('app.current_org_id', true)::UUID);
 
+-- Policy for cost_tracking_monthly - users can only see cost rollups for their organization
+DROP POLICY IF EXISTS cost_monthly_org_isolation ON cost_tracking_monthly;
+CREATE POLICY cost_monthly_org_isolation ON cost_tracking_monthly
+    USING (organization_id = current_setting('app.current_org_id', true)::UUID);
+
 -- Policy for audit_logs - users can only see audit logs for their organization
 DROP POLICY IF EXISTS audit_org_isolation ON audit_logs;
 CREATE POLICY audit_org_isolation ON audit_logs
@@ -242,28 +300,39 @@ CREATE POLICY apikey_org_isolation ON api_keys
 -- Additional Indexes for Performance
 -- ============================================================================
 
+-- Built CONCURRENTLY so re-running this file against a live database doesn't block writes.
+-- CONCURRENTLY cannot run in a transaction block: apply with plain `psql -f`, not -1/--single-transaction.
+-- Partitioned parents (audit_logs, cost_tracking, messages) don't support it and use a regular build.
+
 -- GIN indexes for JSONB columns to enable faster JSON queries
-CREATE INDEX IF NOT EXISTS idx_org_settings_gin ON organizations USING GIN (settings);
-CREATE INDEX IF NOT EXISTS idx_org_metadata_gin ON organizations USING GIN (metadata);
-CREATE INDEX IF NOT EXISTS idx_desk_llm_config_gin ON desks USING GIN (llm_config);
-CREATE INDEX IF NOT EXISTS idx_desk_skills_gin ON desks USING GIN (skills);
-CREATE INDEX IF NOT EXISTS idx_task_context_gin ON tasks USING GIN (context);
-CREATE INDEX IF NOT EXISTS idx_task_metadata_gin ON tasks USING GIN (metadata);
-CREATE INDEX IF NOT EXISTS idx_message_metadata_gin ON messages USING GIN (metadata);
+-- meta_data is only filtered with @> containment, so it uses the smaller jsonb_path_ops opclass
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_org_settings_gin ON organizations USING GIN (settings);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_org_metadata_gin ON organizations USING GIN (meta_data jsonb_path_ops);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_desk_llm_config_gin ON desks USING GIN (llm_config);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_desk_meta_gin ON desks USING GIN (meta_data jsonb_path_ops);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_desk_skills_gin ON desks USING GIN (skills);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_task_context_gin ON tasks USING GIN (context);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_task_metadata_gin ON tasks USING GIN (meta_data jsonb_path_ops);
+CREATE INDEX IF NOT EXISTS idx_message_metadata_gin ON messages USING GIN (meta_data jsonb_path_ops);
+CREATE INDEX IF NOT EXISTS idx_audit_meta_gin ON audit_logs USING GIN (meta_data jsonb_path_ops);
+
+-- Expression indexes for hot scalar keys read out of JSONB
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_desk_llm_config_model ON desks ((llm_config->>'model'));
 
 -- Partial indexes for common queries
-CREATE INDEX IF NOT EXISTS idx_desks_active ON desks (organization_id, is_active) WHERE is_active = true;
-CREATE INDEX IF NOT EXISTS idx_tasks_active ON tasks (organization_id, status) WHERE status NOT IN ('completed', 'cancelled');
-CREATE INDEX IF NOT EXISTS idx_tasks_overdue ON tasks (organization_id, due_date) WHERE due_date < NOW() AND status NOT IN ('completed', 'cancelled');
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_desks_active ON desks (organization_id, is_active) WHERE is_active = true;
+-- Open tasks are covered by idx_task_open in the migration. Index predicates must be immutable,
+-- so overdue is "open with a due date"; the due_date < NOW() check goes in the query.
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_tasks_overdue ON tasks (organization_id, due_date) WHERE due_date IS NOT NULL AND status NOT IN ('completed', 'cancelled');
 
 -- Composite indexes for common query patterns
-CREATE INDEX IF NOT EXISTS idx_tasks_org_status_priority ON tasks (organization_id, status, priority);
-CREATE INDEX IF NOT EXISTS idx_sessions_desk_date ON agent_sessions (desk_id, started_at DESC);
+-- (organization_id, status, priority) is covered by idx_task_dashboard in the migration
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_sessions_desk_date ON agent_sessions (desk_id, started_at DESC);
 CREATE INDEX IF NOT EXISTS idx_cost_org_month_provider ON cost_tracking (organization_id, billing_month, provider);
 
 -- Text search indexes for full-text search capabilities
-CREATE INDEX IF NOT EXISTS idx_tasks_title_fts ON tasks USING GIN (to_tsvector('english', title));
-CREATE INDEX IF NOT EXISTS idx_tasks_description_fts ON tasks USING GIN (to_tsvector('english', description));
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_tasks_title_fts ON tasks USING GIN (to_tsvector('english', title));
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_tasks_description_fts ON tasks USING GIN (to_tsvector('english', description));
 
 -- ============================================================================
 -- Materialized Views for Analytics
@@ -330,12 +399,13 @@ BEGIN
         COUNT(DISTINCT t.id)::INTEGER as total_tasks,
         COUNT(DISTINCT CASE WHEN t.status IN ('in_progress', 'assigned', 'in_review') THEN t.id END)::INTEGER as active_tasks,
         COUNT(DISTINCT CASE WHEN t.status = 'completed' THEN t.id END)::INTEGER as completed_tasks,
-        COALESCE(SUM(ct.total_cost), 0) as total_cost_this_month
+        COALESCE((
+            SELECT cm.total_cost FROM cost_tracking_monthly cm
+            WHERE cm.organization_id = o.id AND cm.billing_month = TO_CHAR(NOW(), 'YYYY-MM')
+        ), 0) as total_cost_this_month
     FROM organizations o
     LEFT JOIN desks d ON d.organization_id = o.id AND d.deleted_at IS NULL
     LEFT JOIN tasks t ON t.organization_id = o.id
-    LEFT JOIN cost_tracking ct ON ct.organization_id = o.id
-        AND ct.billing_month = TO_CHAR(NOW(), 'YYYY-MM')
     WHERE o.id = org_id
     GROUP BY o.id;
 END;
@@ -354,32 +424,33 @@ $$ LANGUAGE plpgsql;
 -- Partitioning Setup for Large Tables
 -- ============================================================================
 
--- Note: For production at scale, consider partitioning these tables:
--- 1. cost_tracking - partition by billing_month (range partitioning)
--- 2. audit_logs - partition by created_at (range partitioning)
--- 3. messages - partition by created_at (range partitioning)
-
--- Example partitioning for cost_tracking (commented out, enable when needed):
-/*
--- Convert cost_tracking to partitioned table
-ALTER TABLE cost_tracking RENAME TO cost_tracking_old;
-
-CREATE TABLE cost_tracking (
-    LIKE cost_tracking_old INCLUDING ALL
-) PARTITION BY RANGE (billing_month);
+-- cost_tracking, audit_logs and messages are created partitioned by RANGE (created_at) in
+-- the multi-tenant schema migration, with monthly partitions and a DEFAULT partition.
 
--- Create partitions for each month
-CREATE TABLE cost_tracking_2026_01 PARTITION OF cost_tracking
-    FOR VALUES FROM ('2026-01') TO ('2026-02');
-
--- Add more partitions as needed...
-
--- Migrate data
-INSERT INTO cost_tracking SELECT * FROM cost_tracking_old;
+-- Create next month's partition for each time-partitioned table ahead of time
+CREATE OR REPLACE FUNCTION create_next_month_partitions()
+RETURNS void AS $$
+DECLARE
+    part_start DATE := date_trunc('month', NOW() + INTERVAL '1 month')::DATE;
+    part_end DATE := (date_trunc('month', NOW() + INTERVAL '1 month') + INTERVAL '1 month')::DATE;
+    parent TEXT;
+BEGIN
+    FOREACH parent IN ARRAY ARRAY['cost_tracking', 'audit_logs', 'messages'] LOOP
+        EXECUTE format(
+            'CREATE TABLE IF NOT EXISTS %I PARTITION OF %I FOR VALUES FROM (%L) TO (%L)',
+            parent || '_' || to_char(part_start, 'YYYY_MM'), parent, part_start, part_end
+        );
+    END LOOP;
+END;
+$$ LANGUAGE plpgsql;
 
--- Drop old table
-DROP TABLE cost_tracking_old;
-*/
+-- Run it monthly through pg_cron where the extension is available
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_cron') THEN
+        PERFORM cron.schedule('create-next-month-partitions', '0 0 25 * *', 'SELECT create_next_month_partitions()');
+    END IF;
+END $$;
 
 -- ============================================================================
 -- Comments for Documentation
@@ -397,6 +468,7 @@ COMMENT ON TABLE workflows IS 'Workflow templates defining stages, transitions,
 COMMENT ON TABLE knowledge_bases IS 'Knowledge bases containing information for agent access.';
 COMMENT ON TABLE data_sources IS 'Data sources for knowledge bases with sync capabilities.';
 COMMENT ON TABLE cost_tracking IS 'LLM API cost tracking per organization, desk, task, and session.';
+COMMENT ON TABLE cost_tracking_monthly IS 'Per-organization monthly cost totals maintained by trigger from cost_tracking.';
 COMMENT ON TABLE audit_logs IS 'Comprehensive audit log for compliance and security.';
 COMMENT ON TABLE api_keys IS 'API keys for programmatic access with usage tracking.';
 
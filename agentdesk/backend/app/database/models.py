@@ -6,16 +6,16 @@ import datetime
 class Agent(Base):
     __tablename__ = "agents"
 
-    id = Column(Integer, primary_key=True, index=True)
+    id = Column(Integer, primary_key=True)
     name = Column(String, unique=True, index=True)
     description = Column(String)
-    versions = relationship("AgentVersion", back_populates="agent")
+    versions = relationship("AgentVersion", back_populates="agent", lazy="selectin", passive_deletes=True)
 
 class AgentVersion(Base):
     __tablename__ = "agent_versions"
 
-    id = Column(Integer, primary_key=True, index=True)
-    agent_id = Column(Integer, ForeignKey("agents.id"))
+    id = Column(Integer, primary_key=True)
+    agent_id = Column(Integer, ForeignKey("agents.id", ondelete="CASCADE"), index=True)
     version_number = Column(String)
     release_notes = Column(Text)
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
@@ -24,16 +24,16 @@ class AgentVersion(Base):
 class KnowledgeBase(Base):
     __tablename__ = "knowledge_bases"
 
-    id = Column(Integer, primary_key=True, index=True)
+    id = Column(Integer, primary_key=True)
     name = Column(String, unique=True, index=True)
     description = Column(String)
-    datasources = relationship("DataSource", back_populates="knowledge_base")
+    datasources = relationship("DataSource", back_populates="knowledge_base", lazy="selectin", passive_deletes=True)
 
 class DataSource(Base):
     __tablename__ = "data_sources"
 
-    id = Column(Integer, primary_key=True, index=True)
-    knowledge_base_id = Column(Integer, ForeignKey("knowledge_bases.id"))
+    id = Column(Integer, primary_key=True)
+    knowledge_base_id = Column(Integer, ForeignKey("knowledge_bases.id", ondelete="CASCADE"), index=True)
     name = Column(String)
     type = Column(String) # e.g., 'github', 'web', 'file'
     uri = Column(String)
@@ -1,66 +1,310 @@
-from fastapi import Depends, FastAPI, HTTPException
-from sqlalchemy.orm import Session
-from typing import List
+import asyncio
+import logging
+import os
+import queue
+from logging.handlers import QueueHandler, QueueListener
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
 
-from . import crud, schemas, mcp
-from .database import models, SessionLocal, engine
+import orjson
+from fastapi import Depends, FastAPI, Header, HTTPException, Query, Request, Response
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from pydantic import TypeAdapter, ValidationError
+from datetime import datetime
+from typing import List, Optional
+from uuid import UUID
 
-models.Base.metadata.create_all(bind=engine)
+from . import audit, crud, migrate, schemas, mcp
+from .database import models, SessionLocal, engine, check_database_health, set_organization_context
 
-app = FastAPI()
+# Seconds between background database health checks
+DB_HEALTH_CHECK_INTERVAL = 30
 
-# Dependency
-def get_db():
-    db = SessionLocal()
-    try:
+# Threads behind asyncio.to_thread (blocking SDK calls such as Gemini, Chroma, Alembic); a
+# fixed pool queues bursts instead of letting them contend for the GIL
+AGENT_THREADS = int(os.getenv("AGENT_THREADS", "8"))
+
+# Root log level (e.g. INFO, DEBUG); unset leaves whatever the server or host configured
+LOG_LEVEL = os.getenv("LOG_LEVEL")
+
+def start_log_listener():
+    """Route log records through a queue so request handlers never block on stream writes"""
+    log_queue = queue.SimpleQueue()
+    listener = QueueListener(log_queue, logging.StreamHandler(), respect_handler_level=True)
+    handler = QueueHandler(log_queue)
+    root = logging.getLogger()
+    root.addHandler(handler)
+    if LOG_LEVEL:
+        root.setLevel(LOG_LEVEL.upper())
+    listener.start()
+    return handler, listener
+
+async def monitor_database():
+    """Periodically probe the database and drop pooled connections after a failure"""
+    while True:
+        if not await check_database_health():
+            # Stale connections are discarded so the next checkout reconnects
+            await engine.dispose()
+        await asyncio.sleep(DB_HEALTH_CHECK_INTERVAL)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    log_handler, log_listener = start_log_listener()
+    asyncio.get_running_loop().set_default_executor(
+        ThreadPoolExecutor(max_workers=AGENT_THREADS, thread_name_prefix="agent")
+    )
+    async with engine.begin() as conn:
+        await conn.run_sync(models.Base.metadata.create_all)
+    health_task = asyncio.create_task(monitor_database())
+    audit.start_audit_writer()
+    if migrate.RUN_MIGRATIONS_ON_STARTUP:
+        migrate.start_migrations()
+    yield
+    health_task.cancel()
+    await audit.stop_audit_writer()
+    await mcp.MCP_CLIENT.aclose()
+    logging.getLogger().removeHandler(log_handler)
+    log_listener.stop()
+
+# orjson encodes the nested, datetime-heavy response models faster than stdlib json
+app = FastAPI(lifespan=lifespan, default_response_class=ORJSONResponse)
+
+# Built once at import so list responses skip per-request model and encoder resolution
+_agent_list_adapter = TypeAdapter(List[schemas.Agent])
+_knowledge_base_list_adapter = TypeAdapter(List[schemas.KnowledgeBase])
+_data_source_list_adapter = TypeAdapter(List[schemas.DataSource])
+
+def json_list_response(adapter: TypeAdapter, rows) -> Response:
+    """Validate ORM rows and encode them in pydantic-core, bypassing FastAPI's response model pass"""
+    items = adapter.validate_python(rows, from_attributes=True)
+    return Response(content=adapter.dump_json(items), media_type="application/json")
+
+# Dependencies
+async def get_organization_id(x_organization_id: Optional[UUID] = Header(None)) -> Optional[UUID]:
+    """Scope the request's sessions to the organization in X-Organization-ID for RLS
+
+    Each request runs in its own task, so the context never outlives it.
+    """
+    set_organization_context(x_organization_id)
+    return x_organization_id
+
+async def get_db(organization_id: Optional[UUID] = Depends(get_organization_id)):
+    async with SessionLocal() as db:
         yield db
-    finally:
-        db.close()
+
+async def get_audited_organization_id(
+    organization_id: Optional[UUID] = Depends(get_organization_id), db: AsyncSession = Depends(get_db)
+) -> Optional[UUID]:
+    """The request's organization for audit entries; the header is client-supplied, so an
+    organization that doesn't exist is rejected before anything is written"""
+    if organization_id is not None and not await audit.organization_exists(db, organization_id):
+        raise HTTPException(status_code=400, detail="Unknown organization")
+    return organization_id
+
+def audit_create(organization_id: Optional[UUID], resource_type: str, resource_ids: List[int]):
+    """Queue an audit entry per created row; audit_logs rows belong to an organization, so
+    requests without one aren't audited. API ids are integers, so they go in meta_data."""
+    if organization_id is not None:
+        for resource_id in resource_ids:
+            audit.record_audit(
+                organization_id=organization_id,
+                actor_type="api",
+                action="create",
+                resource_type=resource_type,
+                meta_data={"id": resource_id},
+            )
+
+async def ndjson_lines(chunks):
+    """Split a streamed request body into its non-blank lines without reading it all first"""
+    buffer = b""
+    async for chunk in chunks:
+        *lines, buffer = (buffer + chunk).split(b"\n")
+        for line in lines:
+            if line.strip():
+                yield line
+    if buffer.strip():
+        yield buffer
+
+def ndjson_response(rows, schema):
+    """Stream ORM rows as orjson-encoded JSON lines, one validated row in memory at a time"""
+    async def lines():
+        async for row in rows:
+            yield orjson.dumps(schema.model_validate(row, from_attributes=True).model_dump()) + b"\n"
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+@app.get("/health")
+async def health():
+    if not await check_database_health():
+        raise HTTPException(status_code=503, detail="Database unavailable")
+    return {"database": "ok"}
+
+@app.get("/health/migration")
+async def migration_health():
+    status = await migrate.migration_status()
+    if not status["up_to_date"]:
+        return ORJSONResponse(status, status_code=503)
+    return status
+
+@app.get("/stats", response_model=schemas.Stats)
+async def read_stats(db: AsyncSession = Depends(get_db)):
+    # Counts only, so the dashboard doesn't download whole lists to measure them
+    return (await crud.get_stats(db))._asdict()
+
+@app.get("/audit-logs/")
+async def read_audit_logs(
+    before: Optional[datetime] = None,
+    limit: int = 100,
+    organization_id: Optional[UUID] = Depends(get_organization_id),
+    db: AsyncSession = Depends(get_db),
+):
+    if organization_id is None:
+        raise HTTPException(status_code=400, detail="X-Organization-ID header required")
+    rows = await audit.list_audit_logs(db, organization_id, before=before, limit=limit)
+    return [dict(row) for row in rows]
+
+@app.post("/cost-tracking/import")
+async def import_cost_tracking(
+    request: Request,
+    organization_id: Optional[UUID] = Depends(get_audited_organization_id),
+    db: AsyncSession = Depends(get_db),
+):
+    """Load NDJSON CostTrackingRecord lines for the request's organization with one COPY"""
+    if organization_id is None:
+        raise HTTPException(status_code=400, detail="X-Organization-ID header required")
+    if db.bind.dialect.name != "postgresql":
+        raise HTTPException(status_code=501, detail="Cost import requires PostgreSQL")
+    imported = 0
+    async def rows():
+        nonlocal imported
+        # Parsed as the body arrives, so a large import is never held in memory
+        async for line in ndjson_lines(request.stream()):
+            imported += 1
+            yield crud.cost_tracking_row(organization_id, schemas.CostTrackingRecord.model_validate_json(line))
+    try:
+        await crud.copy_cost_tracking(db, rows())
+    except ValidationError as exc:
+        # The COPY is aborted, so none of the import is kept
+        raise HTTPException(status_code=422, detail=f"Line {imported}: {exc.errors(include_url=False)}")
+    return {"imported": imported}
 
 @app.post("/agents/", response_model=schemas.Agent)
-def create_agent(agent: schemas.AgentCreate, db: Session = Depends(get_db)):
-    return crud.create_agent(db=db, agent=agent)
+async def create_agent(
+    agent: schemas.AgentCreate,
+    organization_id: Optional[UUID] = Depends(get_audited_organization_id),
+    db: AsyncSession = Depends(get_db),
+):
+    db_agent = await crud.create_agent(db=db, agent=agent)
+    audit_create(organization_id, "agent", [db_agent.id])
+    return db_agent
+
+@app.post("/agents/bulk", response_model=List[int])
+async def create_agents(
+    agents: List[schemas.AgentCreate],
+    organization_id: Optional[UUID] = Depends(get_audited_organization_id),
+    db: AsyncSession = Depends(get_db),
+):
+    ids = await crud.create_agents_bulk(db, agents)
+    audit_create(organization_id, "agent", ids)
+    return ids
 
 @app.get("/agents/", response_model=List[schemas.Agent])
-def read_agents(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    agents = crud.get_agents(db, skip=skip, limit=limit)
-    return agents
+async def read_agents(
+    after_id: Optional[int] = None,
+    limit: int = 100,
+    ids: Optional[List[int]] = Query(None),
+    db: AsyncSession = Depends(get_db),
+):
+    # ?ids=1&ids=2 resolves a known set of agents in one query instead of one request per id
+    if ids is not None:
+        return json_list_response(_agent_list_adapter, await crud.get_agents_by_ids(db, ids))
+    agents = await crud.get_agents(db, after_id=after_id, limit=limit)
+    return json_list_response(_agent_list_adapter, agents)
+
+@app.get("/agents/summary", response_model=List[schemas.AgentSummary])
+async def read_agents_summary(after_id: Optional[int] = None, limit: int = 100, db: AsyncSession = Depends(get_db)):
+    return await crud.list_agents_summary(db, after_id=after_id, limit=limit)
+
+@app.get("/agents/export")
+async def export_agents(db: AsyncSession = Depends(get_db)):
+    return ndjson_response(crud.stream_agents(db), schemas.Agent)
 
 @app.get("/agents/{agent_id}", response_model=schemas.Agent)
-def read_agent(agent_id: int, db: Session = Depends(get_db)):
-    db_agent = crud.get_agent(db, agent_id=agent_id)
+async def read_agent(agent_id: int, db: AsyncSession = Depends(get_db)):
+    db_agent = await crud.get_agent(db, agent_id=agent_id)
     if db_agent is None:
         raise HTTPException(status_code=404, detail="Agent not found")
     return db_agent
 
 @app.post("/knowledge-bases/", response_model=schemas.KnowledgeBase)
-def create_knowledge_base(kb: schemas.KnowledgeBaseCreate, db: Session = Depends(get_db)):
-    return crud.create_knowledge_base(db=db, kb=kb)
+async def create_knowledge_base(
+    kb: schemas.KnowledgeBaseCreate,
+    organization_id: Optional[UUID] = Depends(get_audited_organization_id),
+    db: AsyncSession = Depends(get_db),
+):
+    db_kb = await crud.create_knowledge_base(db=db, kb=kb)
+    audit_create(organization_id, "knowledge_base", [db_kb.id])
+    return db_kb
+
+@app.post("/knowledge-bases/bulk", response_model=List[int])
+async def create_knowledge_bases(
+    kbs: List[schemas.KnowledgeBaseCreate],
+    organization_id: Optional[UUID] = Depends(get_audited_organization_id),
+    db: AsyncSession = Depends(get_db),
+):
+    ids = await crud.create_knowledge_bases_bulk(db, kbs)
+    audit_create(organization_id, "knowledge_base", ids)
+    return ids
 
 @app.get("/knowledge-bases/", response_model=List[schemas.KnowledgeBase])
-def read_knowledge_bases(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    kbs = crud.get_knowledge_bases(db, skip=skip, limit=limit)
-    return kbs
+async def read_knowledge_bases(after_id: Optional[int] = None, limit: int = 100, db: AsyncSession = Depends(get_db)):
+    kbs = await crud.get_knowledge_bases(db, after_id=after_id, limit=limit)
+    return json_list_response(_knowledge_base_list_adapter, kbs)
+
+@app.get("/knowledge-bases/export")
+async def export_knowledge_bases(db: AsyncSession = Depends(get_db)):
+    return ndjson_response(crud.stream_knowledge_bases(db), schemas.KnowledgeBase)
 
 @app.get("/knowledge-bases/{kb_id}", response_model=schemas.KnowledgeBase)
-def read_knowledge_base(kb_id: int, db: Session = Depends(get_db)):
-    db_kb = crud.get_knowledge_base(db, kb_id=kb_id)
+async def read_knowledge_base(kb_id: int, db: AsyncSession = Depends(get_db)):
+    db_kb = await crud.get_knowledge_base(db, kb_id=kb_id)
     if db_kb is None:
         raise HTTPException(status_code=404, detail="KnowledgeBase not found")
     return db_kb
 
 @app.post("/knowledge-bases/{kb_id}/datasources/", response_model=schemas.DataSource)
-def create_data_source_for_kb(
-    kb_id: int, ds: schemas.DataSourceCreate, db: Session = Depends(get_db)
+async def create_data_source_for_kb(
+    kb_id: int,
+    ds: schemas.DataSourceCreate,
+    organization_id: Optional[UUID] = Depends(get_audited_organization_id),
+    db: AsyncSession = Depends(get_db),
+):
+    db_ds = await crud.create_data_source(db=db, ds=ds, kb_id=kb_id)
+    audit_create(organization_id, "data_source", [db_ds.id])
+    return db_ds
+
+@app.post("/knowledge-bases/{kb_id}/datasources/bulk", response_model=List[int])
+async def create_data_sources_for_kb(
+    kb_id: int,
+    dss: List[schemas.DataSourceCreate],
+    organization_id: Optional[UUID] = Depends(get_audited_organization_id),
+    db: AsyncSession = Depends(get_db),
 ):
-    return crud.create_data_source(db=db, ds=ds, kb_id=kb_id)
+    ids = await crud.create_data_sources_bulk(db, dss, kb_id=kb_id)
+    audit_create(organization_id, "data_source", ids)
+    return ids
 
 @app.get("/datasources/", response_model=List[schemas.DataSource])
-def read_data_sources(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    dss = crud.get_data_sources(db, skip=skip, limit=limit)
-    return dss
+async def read_data_sources(after_id: Optional[int] = None, limit: int = 100, db: AsyncSession = Depends(get_db)):
+    dss = await crud.get_data_sources(db, after_id=after_id, limit=limit)
+    return json_list_response(_data_source_list_adapter, dss)
+
+@app.get("/datasources/export")
+async def export_data_sources(db: AsyncSession = Depends(get_db)):
+    return ndjson_response(crud.stream_data_sources(db), schemas.DataSource)
 
 @app.get("/mcp/search")
 async def search_mcp_endpoint(q: str):
-    return await mcp.search_mcp(q)
+    # Each source's result is sent as it arrives instead of waiting for the slowest one
+    return StreamingResponse(mcp.stream_mcp(q), media_type="application/x-ndjson")
 
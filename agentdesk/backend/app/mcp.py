@@ -1,20 +1,101 @@
+import asyncio
+
 import httpx
-from fastapi import HTTPException
+import orjson
+from cachetools import TTLCache
 
-MCP_SOURCES = [
-    "https://api.github.com/search/repositories?q=topic:mcp",
-    "https://mcp.so/api/search",
-    "https://glama.ai/mcp/reference/api/search",
-]
+# Parsed once at import; a q already present on a source (e.g. GitHub's topic filter) is kept
+# and the search text is appended to it
+MCP_SOURCES = tuple(
+    httpx.URL(url)
+    for url in (
+        "https://api.github.com/search/repositories?q=topic:mcp",
+        "https://mcp.so/api/search",
+        "https://glama.ai/mcp/reference/api/search",
+    )
+)
 
-async def search_mcp(query: str):
-    results = []
-    async with httpx.AsyncClient() as client:
-        for source in MCP_SOURCES:
-            try:
-                response = await client.get(f"{source}?q={query}")
-                response.raise_for_status()
-                results.append(response.json())
-            except httpx.HTTPStatusError as exc:
-                raise HTTPException(status_code=exc.response.status_code, detail=f"Error connecting to {source}")
+# Shared across requests so keep-alive and HTTP/2 connections to the sources are reused;
+# closed by the application lifespan
+MCP_CLIENT = httpx.AsyncClient(
+    http2=True,
+    limits=httpx.Limits(max_keepalive_connections=32, max_connections=128),
+    timeout=httpx.Timeout(5.0, connect=2.0),
+)
+
+# Repeated searches within the TTL are answered from memory; concurrent identical searches
+# share a single upstream fan-out
+MCP_CACHE_SIZE = 1024
+MCP_CACHE_TTL = 60
+_search_cache = TTLCache(maxsize=MCP_CACHE_SIZE, ttl=MCP_CACHE_TTL)
+_in_flight = {}
+
+async def _fetch(client: httpx.AsyncClient, source: httpx.URL, query: str):
+    # httpx percent-encodes params and replaces the existing q rather than appending a second "?"
+    q = " ".join(filter(None, (source.params.get("q"), query)))
+    response = await client.get(source, params=source.params.set("q", q))
+    response.raise_for_status()
+    return orjson.loads(response.content)
+
+def _source_error(source: httpx.URL, exc: Exception):
+    if isinstance(exc, httpx.HTTPStatusError):
+        error = f"HTTP {exc.response.status_code}"
+    else:
+        error = str(exc) or type(exc).__name__
+    return {"source": str(source), "error": error}
+
+async def _search_sources(query: str):
+    responses = await asyncio.gather(
+        *(_fetch(MCP_CLIENT, source, query) for source in MCP_SOURCES), return_exceptions=True
+    )
+    results = [
+        _source_error(source, response) if isinstance(response, Exception) else response
+        for source, response in zip(MCP_SOURCES, responses)
+    ]
+    # Results with a failed source are returned but not cached, so it is retried next time
+    if not any(isinstance(response, Exception) for response in responses):
+        _search_cache[query] = results
     return results
+
+async def search_mcp(query: str):
+    """Query every MCP source concurrently; a failed source yields a {"source", "error"} entry"""
+    query = query.strip().lower()
+    if query in _search_cache:
+        return _search_cache[query]
+    search = _in_flight.get(query)
+    if search is None:
+        search = _in_flight[query] = asyncio.create_task(_search_sources(query))
+        search.add_done_callback(lambda _: _in_flight.pop(query, None))
+    # Shielded so one caller disconnecting does not cancel the search for the others
+    return await asyncio.shield(search)
+
+async def stream_mcp(query: str):
+    """Yield one NDJSON line per MCP source as soon as that source answers
+
+    Lines are {"source", "result"} or {"source", "error"}, in completion order.
+    """
+    query = query.strip().lower()
+    if query in _search_cache:
+        for source, result in zip(MCP_SOURCES, _search_cache[query]):
+            yield orjson.dumps({"source": str(source), "result": result}) + b"\n"
+        return
+    fetches = {asyncio.create_task(_fetch(MCP_CLIENT, source, query)): source for source in MCP_SOURCES}
+    results = {}
+    pending = set(fetches)
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for fetch in done:
+                source = fetches[fetch]
+                if fetch.exception() is not None:
+                    line = _source_error(source, fetch.exception())
+                else:
+                    results[source] = fetch.result()
+                    line = {"source": str(source), "result": results[source]}
+                yield orjson.dumps(line) + b"\n"
+    finally:
+        # The client may disconnect mid-stream; don't leave upstream requests running
+        for fetch in pending:
+            fetch.cancel()
+    if len(results) == len(MCP_SOURCES):
+        _search_cache[query] = [results[source] for source in MCP_SOURCES]
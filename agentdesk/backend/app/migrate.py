@@ -0,0 +1,66 @@
+import asyncio
+import logging
+import os
+from functools import lru_cache
+from pathlib import Path
+from typing import Optional
+
+from alembic import command
+from alembic.config import Config
+from alembic.runtime.migration import MigrationContext
+from alembic.script import ScriptDirectory
+
+from .database import engine
+
+logger = logging.getLogger(__name__)
+
+# Opt-in: upgrade to head in the background at startup so the API starts serving immediately
+# instead of waiting out the migration as a blocking deploy step
+RUN_MIGRATIONS_ON_STARTUP = os.getenv("RUN_MIGRATIONS_ON_STARTUP", "false").lower() == "true"
+ALEMBIC_INI = Path(__file__).resolve().parent.parent / "alembic.ini"
+
+migration_task: Optional[asyncio.Task] = None
+migration_error: Optional[str] = None
+
+
+def _alembic_config() -> Config:
+    config = Config(str(ALEMBIC_INI))
+    # Keep the application's logging; env.py would otherwise reload it from alembic.ini
+    config.attributes["configure_logger"] = False
+    return config
+
+
+@lru_cache(maxsize=1)
+def head_revision() -> Optional[str]:
+    return ScriptDirectory.from_config(_alembic_config()).get_current_head()
+
+
+async def _run_migrations():
+    global migration_error
+    try:
+        # Alembic is synchronous; a worker thread keeps the event loop free while DDL runs
+        await asyncio.to_thread(command.upgrade, _alembic_config(), "head")
+    except Exception as exc:
+        migration_error = str(exc) or type(exc).__name__
+        logger.exception("Background migration failed")
+
+
+def start_migrations():
+    """Begin upgrading the database to head without blocking startup"""
+    global migration_task
+    migration_task = asyncio.create_task(_run_migrations())
+
+
+async def migration_status():
+    """Applied revision against the code's head, plus whether a background upgrade is running"""
+    async with engine.connect() as conn:
+        current = await conn.run_sync(
+            lambda sync_conn: MigrationContext.configure(sync_conn).get_current_revision()
+        )
+    return {
+        "current": current,
+        "head": head_revision(),
+        "up_to_date": current == head_revision(),
+        "running": migration_task is not None and not migration_task.done(),
+        "error": migration_error,
+    }
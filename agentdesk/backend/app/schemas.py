@@ -1,6 +1,8 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict
 from typing import List, Optional
+from uuid import UUID
 import datetime
+import decimal
 
 class DataSourceBase(BaseModel):
     name: str
@@ -14,8 +16,7 @@ class DataSource(DataSourceBase):
     id: int
     knowledge_base_id: int
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
 
 class KnowledgeBaseBase(BaseModel):
     name: str
@@ -28,8 +29,7 @@ class KnowledgeBase(KnowledgeBaseBase):
     id: int
     datasources: List[DataSource] = []
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
 
 class AgentVersionBase(BaseModel):
     version_number: str
@@ -43,8 +43,7 @@ class AgentVersion(AgentVersionBase):
     agent_id: int
     created_at: datetime.datetime
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
 
 class AgentBase(BaseModel):
     name: str
@@ -57,5 +56,28 @@ class Agent(AgentBase):
     id: int
     versions: List[AgentVersion] = []
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
+
+class AgentSummary(BaseModel):
+    id: int
+    name: str
+
+    model_config = ConfigDict(from_attributes=True)
+
+class Stats(BaseModel):
+    agents: int
+    knowledge_bases: int
+    data_sources: int
+
+class CostTrackingRecord(BaseModel):
+    """One LLM call's usage for the cost import; the organization comes from the request"""
+    desk_id: Optional[UUID] = None
+    task_id: Optional[UUID] = None
+    session_id: Optional[int] = None
+    provider: str
+    model: str
+    input_tokens: int = 0
+    output_tokens: int = 0
+    input_cost: decimal.Decimal = decimal.Decimal(0)
+    output_cost: decimal.Decimal = decimal.Decimal(0)
+    created_at: datetime.datetime
@@ -5,11 +5,28 @@ class PIIMasker:
     
     EMAIL_REGEX = r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b'
     PHONE_REGEX = r'\b\d{3}[-.]?\d{3}[-.]?\d{4}\b'
+    # Compiled once with the class, for callers matching a single kind of PII
+    EMAIL_RE = re.compile(EMAIL_REGEX)
+    PHONE_RE = re.compile(PHONE_REGEX)
     
-    @staticmethod
-    def mask(text: str) -> str:
+    @classmethod
+    def mask(cls, text: str) -> str:
         if not text:
             return ""
-        text = re.sub(PIIMasker.EMAIL_REGEX, '[EMAIL_REDACTED]', text)
-        text = re.sub(PIIMasker.PHONE_REGEX, '[PHONE_REDACTED]', text)
-        return text
+        # One pass over the text for every kind of PII
+        return _PII_RE.sub(_redact, text)
+
+
+_REDACTIONS = {
+    "email": "[EMAIL_REDACTED]",
+    "phone": "[PHONE_REDACTED]",
+}
+
+# Compiled once at import; mask() runs on every logged task description
+_PII_RE = re.compile(
+    f"(?P<email>{PIIMasker.EMAIL_RE.pattern})|(?P<phone>{PIIMasker.PHONE_RE.pattern})"
+)
+
+
+def _redact(match: re.Match) -> str:
+    return _REDACTIONS[match.lastgroup]
@@ -0,0 +1,204 @@
+import asyncio
+
+import pytest
+
+# The agent core needs its full provider stack
+pytest.importorskip("chromadb")
+pytest.importorskip("mlflow")
+pytest.importorskip("google.genai")
+
+from app.core import agent
+
+
+
+def test_gemini_clients_are_cached_per_api_key():
+    agent._get_gemini_client.cache_clear()
+
+    async def clients():
+        http_client = agent.provider_http_client()
+        first = agent._get_gemini_client("key-one", http_client)
+        second = agent._get_gemini_client("key-two", agent.provider_http_client())
+        assert agent._get_gemini_client("key-one", agent.provider_http_client()) is first
+        await agent.close_provider_http_client()
+        return http_client, first, second
+
+    http_client, first, second = asyncio.run(clients())
+    assert first is not second
+    assert (first._api_client.api_key, second._api_client.api_key) == ("key-one", "key-two")
+    # Both keys send through the loop's one shared connection pool
+    assert first._api_client._async_httpx_client is second._api_client._async_httpx_client is http_client
+
+
+def test_provider_http_client_is_per_event_loop():
+    async def open_client():
+        client = agent.provider_http_client()
+        assert agent.provider_http_client() is client
+        await agent.close_provider_http_client()
+        return client
+
+    first, second = asyncio.run(open_client()), asyncio.run(open_client())
+    assert first is not second
+    assert first.is_closed and second.is_closed
+
+
+def test_organization_context_persists_created_tasks_and_closes_the_store(tmp_path):
+    path = str(tmp_path / "tasks.db")
+
+    async def run():
+        async with agent.OrganizationStructure("org", agent.TaskStore(path)) as org:
+            task = org.create_task("Write docs", "Document the API", created_by="user-1")
+        assert org.task_store._db is None
+        # A separate store on the same file sees the task that was never delegated
+        reader = agent.TaskStore(path)
+        try:
+            return task, await reader.load_task(task.task_id)
+        finally:
+            await reader.close()
+
+    task, stored = asyncio.run(run())
+    assert stored["title"] == "Write docs"
+    assert agent.Task.from_dict(stored).task_id == task.task_id
+
+
+def test_tasks_created_outside_an_event_loop_are_only_cached_until_saved(tmp_path):
+    org = agent.OrganizationStructure("org", agent.TaskStore(str(tmp_path / "tasks.db")))
+    task = org.create_task("Triage", "Sort the inbox", created_by="user-1")
+
+    async def run():
+        try:
+            assert await org.task_store.load_task(task.task_id) is None
+            assert await org.get_task(task.task_id) is task
+            await org.save_task(task)
+            return await org.task_store.load_task(task.task_id)
+        finally:
+            await org.aclose()
+
+    assert asyncio.run(run())["task_id"] == task.task_id
+
+
+def _desk(desk_id="dev-001", temperature=0.7, **kwargs):
+    return agent.AgentDesk(
+        desk_id=desk_id,
+        title="Engineer",
+        role=agent.AgentRole.ENGINEER,
+        llm_config=agent.LLMConfig(provider="anthropic", model="claude", temperature=temperature),
+        **kwargs,
+    )
+
+
+def test_desk_to_dict_results_are_independent_copies():
+    desk = _desk(capabilities=["code_review"])
+    first = desk.to_dict()
+    assert first["capabilities"] == ["code_review"]
+    first["llm_config"]["api_key"] = None
+    first["capabilities"].append("leaked")
+    second = desk.to_dict()
+    assert "api_key" not in second["llm_config"]
+    assert second["capabilities"] == ["code_review"]
+    assert "api_key" not in desk.llm_config.to_dict()
+
+
+def test_mlflow_runs_are_written_under_each_event_loop(monkeypatch):
+    written = []
+    monkeypatch.setattr(agent, "_write_mlflow_run", lambda entry: written.append(entry["run_name"]))
+
+    async def log(run_name):
+        agent.queue_mlflow_run({"run_name": run_name})
+        await agent.flush_mlflow_runs()
+
+    # The second run would hang on the first loop's queue if the worker were shared
+    asyncio.run(log("first"))
+    asyncio.run(log("second"))
+    assert written == ["first", "second"]
+    assert not agent._mlflow_workers
+
+
+def test_desks_sharing_a_client_keep_their_own_generation_settings(monkeypatch):
+    calls = []
+
+    async def call_anthropic(self, system_prompt, task, temperature, max_tokens):
+        calls.append((task.task_id, temperature, max_tokens))
+        return {"result": "done"}
+
+    monkeypatch.setattr(agent.LLMClient, "_call_anthropic", call_anthropic)
+    monkeypatch.setattr(agent, "_write_mlflow_run", lambda entry: None)
+    warm, cold = _desk("warm", temperature=0.7), _desk("cold", temperature=0.2)
+    assert warm.llm is cold.llm
+
+    async def run():
+        for desk in (warm, cold):
+            await desk.process_task(agent.Task(task_id=desk.desk_id, title="t", description="d", created_by="u"))
+        await agent.flush_mlflow_runs()
+
+    asyncio.run(run())
+    assert calls == [("warm", 0.7, 4000), ("cold", 0.2, 4000)]
+
+
+def _embed(text):
+    # Identical text embeds identically; anything else lands far apart
+    digest = __import__("hashlib").sha256(text.encode()).digest()
+    return tuple(float(b) for b in digest[:8])
+
+
+def _knowledge_base(tmp_path, name, document):
+    kb = agent.KnowledgeBase(collection_name=name, persist_path=str(tmp_path))
+    kb.add_documents([document], ids=[name], embeddings=[list(_embed(document))])
+    return kb
+
+
+def test_semantic_cache_is_scoped_to_the_desk_and_its_context(tmp_path, monkeypatch):
+    calls = []
+
+    async def call_anthropic(self, system_prompt, task, temperature, max_tokens):
+        calls.append(system_prompt)
+        return {"result": system_prompt}
+
+    monkeypatch.setattr(agent, "_embed_cached", _embed)
+    monkeypatch.setattr(agent.LLMClient, "_call_anthropic", call_anthropic)
+    monkeypatch.setattr(agent, "_write_mlflow_run", lambda entry: None)
+    cache = agent.SemanticCache(persist_path=str(tmp_path))
+    payments = _desk("payments", knowledge_base=_knowledge_base(tmp_path, "payments", "Payments run on Stripe"),
+                     response_cache=cache)
+    billing = _desk("billing", knowledge_base=_knowledge_base(tmp_path, "billing", "Invoices go out monthly"),
+                    response_cache=cache)
+
+    async def run():
+        results = []
+        for desk in (payments, payments, billing):
+            task = agent.Task(task_id="t", title="Integrate", description="Wire up checkout", created_by="u")
+            results.append((await desk.process_task(task))["result"])
+        await agent.flush_mlflow_runs()
+        return results
+
+    first, repeat, other = asyncio.run(run())
+    # Same role and model, but the second desk's prompt carries its own knowledge base context
+    assert len(calls) == 2
+    assert repeat == first and "Stripe" in first
+    assert "Invoices" in other and "Stripe" not in other
+
+
+def test_streamed_answers_go_through_the_semantic_cache(tmp_path, monkeypatch):
+    streamed = []
+
+    async def call_gemini_stream(self, system_prompt, task, temperature, max_tokens):
+        streamed.append(task.task_id)
+        for chunk in ("Use ", "Stripe"):
+            yield chunk
+
+    monkeypatch.setattr(agent, "_embed_cached", _embed)
+    monkeypatch.setattr(agent.LLMClient, "_call_gemini_stream", call_gemini_stream)
+    desk = agent.AgentDesk(
+        desk_id="stream-001",
+        title="Engineer",
+        role=agent.AgentRole.ENGINEER,
+        llm_config=agent.LLMConfig(provider="gemini", model="gemini-pro"),
+        response_cache=agent.SemanticCache(persist_path=str(tmp_path)),
+    )
+
+    async def run(task_id):
+        task = agent.Task(task_id=task_id, title="Integrate", description="Wire up checkout", created_by="u")
+        return [chunk async for chunk in desk.stream_task(task)]
+
+    assert asyncio.run(run("first")) == ["Use ", "Stripe"]
+    assert asyncio.run(run("second")) == ["Use Stripe"]
+    assert streamed == ["first"]
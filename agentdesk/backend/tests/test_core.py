@@ -0,0 +1,175 @@
+import asyncio
+from dataclasses import dataclass
+from enum import Enum
+
+from app.core.batch import BatchProcessor
+from app.core.routing import TaskRouter
+from app.core.store import TaskStore, new_task_id
+
+
+class Status(Enum):
+    PENDING = "pending"
+    COMPLETED = "completed"
+
+
+@dataclass
+class StoredTask:
+    task_id: str
+    title: str
+    status: Status = Status.PENDING
+
+
+def test_task_ids_are_unique_sortable_ulids():
+    ids = [new_task_id() for _ in range(1000)]
+    assert len(set(ids)) == len(ids)
+    assert all(len(task_id) == 26 for task_id in ids)
+    # Monotonic even within one millisecond, so ids sort in creation order
+    assert ids == sorted(ids)
+
+
+def test_task_store_round_trip(tmp_path):
+    async def scenario():
+        store = TaskStore(str(tmp_path / "tasks.db"))
+        first = StoredTask(new_task_id(), "first")
+        second = StoredTask(new_task_id(), "second", Status.COMPLETED)
+        await store.save_task(first)
+        await store.save_task(second)
+        first.title = "first, renamed"
+        await store.save_task(first)
+        loaded = await store.load_task(first.task_id)
+        listed = await store.list_tasks()
+        completed = await store.list_tasks(status="completed")
+        missing = await store.load_task("unknown")
+        await store.close()
+
+        # A second store on the same file sees the first one's writes
+        other = TaskStore(str(tmp_path / "tasks.db"))
+        shared = await other.load_task(second.task_id)
+        await other.close()
+        return loaded, listed, completed, missing, shared
+
+    loaded, listed, completed, missing, shared = asyncio.run(scenario())
+    assert loaded == {"task_id": loaded["task_id"], "title": "first, renamed", "status": "pending"}
+    assert [t["title"] for t in listed] == ["first, renamed", "second"]
+    assert [t["title"] for t in completed] == ["second"]
+    assert missing is None
+    assert shared["status"] == "completed"
+
+
+def test_task_store_lru_evicts_oldest():
+    store = TaskStore(cache_size=2)
+    tasks = [StoredTask(new_task_id(), str(i)) for i in range(3)]
+    store.cache(tasks[0])
+    store.cache(tasks[1])
+    assert store.cached(tasks[0].task_id) is tasks[0]
+    store.cache(tasks[2])
+    # tasks[0] was touched last, so tasks[1] is the one evicted
+    assert store.cached(tasks[1].task_id) is None
+    assert store.cached(tasks[0].task_id) is tasks[0]
+    assert store.cached(tasks[2].task_id) is tasks[2]
+
+
+def test_task_store_defaults_to_memory():
+    async def scenario():
+        store = TaskStore()
+        task = StoredTask(new_task_id(), "in memory")
+        await store.save_task(task)
+        loaded = await store.load_task(task.task_id)
+        await store.close()
+        return store.path, loaded
+
+    path, loaded = asyncio.run(scenario())
+    assert path == ":memory:"
+    assert loaded["title"] == "in memory"
+
+
+@dataclass
+class Rule:
+    keywords: list
+    route_to: str
+
+
+def test_router_returns_first_matching_rule():
+    router = TaskRouter([Rule(["auth"], "security"), Rule(["authentication", "UI"], "frontend")])
+    # "auth" overlaps the longer "authentication"; the earlier rule still wins
+    assert router.route("Build the Authentication page") == "security"
+    assert router.route("fix a ui glitch") == "frontend"
+    assert router.route("nothing relevant") is None
+
+
+def test_router_prefers_rule_order_over_position():
+    router = TaskRouter([Rule(["database"], "dba"), Rule(["deploy"], "ops")])
+    assert router.route("deploy the database migration") == "dba"
+
+
+def test_router_without_keywords_routes_nothing():
+    assert TaskRouter([]).route("anything") is None
+    assert TaskRouter([Rule([], "nowhere"), Rule([""], "empty")]).route("anything") is None
+
+
+def test_router_escapes_keyword_metacharacters():
+    router = TaskRouter([Rule(["c++", "a.b"], "native")])
+    assert router.route("port it to C++") == "native"
+    assert router.route("axb") is None
+
+
+class FakeDesk:
+    """Records how many of its tasks run at once; fails each task ``failures`` times first"""
+
+    def __init__(self, failures: int = 0, duration: float = 0.01):
+        self.failures = failures
+        self.duration = duration
+        self.attempts = {}
+        self.running = 0
+        self.max_running = 0
+
+    async def process_task(self, task):
+        self.running += 1
+        self.max_running = max(self.max_running, self.running)
+        await asyncio.sleep(self.duration)
+        self.running -= 1
+        self.attempts[task.task_id] = self.attempts.get(task.task_id, 0) + 1
+        if self.attempts[task.task_id] <= self.failures:
+            return {"error": "transient"}
+        return {"result": task.title}
+
+
+def test_batch_processor_serializes_each_desk_but_not_the_batch():
+    shared, other = FakeDesk(), FakeDesk()
+    jobs = [(shared, StoredTask(f"s{i}", f"shared {i}")) for i in range(3)]
+    jobs += [(other, StoredTask(f"o{i}", f"other {i}")) for i in range(3)]
+    progress = []
+
+    processor = BatchProcessor(
+        max_concurrency=6,
+        rate_limit=60000,
+        progress_callback=lambda done, total: progress.append((done, total))
+    )
+    results = asyncio.run(processor.run(jobs))
+
+    assert results == {task.task_id: {"result": task.title} for _, task in jobs}
+    assert shared.max_running == other.max_running == 1
+    assert progress[-1] == (6, 6)
+
+
+def test_batch_processor_retries_failures():
+    desk = FakeDesk(failures=1)
+    processor = BatchProcessor(rate_limit=60000, max_retries=1)
+    results = asyncio.run(processor.run([(desk, StoredTask("t1", "retried"))]))
+    assert results == {"t1": {"result": "retried"}}
+    assert desk.attempts == {"t1": 2}
+
+
+def test_batch_processor_spaces_starts_without_serializing_waiters():
+    async def scenario():
+        desks = [FakeDesk(duration=0) for _ in range(5)]
+        loop = asyncio.get_running_loop()
+        begin = loop.time()
+        await BatchProcessor(max_concurrency=5, rate_limit=1200).run(
+            [(desk, StoredTask(f"t{i}", "x")) for i, desk in enumerate(desks)]
+        )
+        return loop.time() - begin
+
+    # 1200/min is one start every 50ms: five starts take ~200ms, not five sequential sleeps
+    elapsed = asyncio.run(scenario())
+    assert 0.18 <= elapsed < 0.5
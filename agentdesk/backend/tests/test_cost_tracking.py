@@ -0,0 +1,91 @@
+import asyncio
+import datetime
+import decimal
+import os
+import uuid
+
+import pytest
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+
+from app import crud, schemas
+from app.main import ndjson_lines
+
+TEST_POSTGRES_URL = os.getenv("TEST_POSTGRES_URL")
+
+
+def _record(**fields):
+    return schemas.CostTrackingRecord(provider="gemini", model="gemini-pro", **fields)
+
+
+def test_cost_tracking_row_fills_totals_and_billing_month():
+    organization_id = uuid.uuid4()
+    record = _record(
+        input_tokens=120, output_tokens=30, input_cost=decimal.Decimal("0.0012"), output_cost=decimal.Decimal("0.0006"),
+        # Still February in UTC
+        created_at=datetime.datetime(2026, 3, 1, 1, 0, tzinfo=datetime.timezone(datetime.timedelta(hours=2))),
+    )
+    row = dict(zip(crud.COST_TRACKING_COPY_COLUMNS, crud.cost_tracking_row(organization_id, record)))
+    assert row["organization_id"] == organization_id
+    assert row["total_tokens"] == 150
+    assert row["total_cost"] == decimal.Decimal("0.0018")
+    assert row["billing_month"] == "2026-02"
+
+
+def test_cost_tracking_row_treats_naive_times_as_utc():
+    row = crud.cost_tracking_row(uuid.uuid4(), _record(created_at=datetime.datetime(2026, 5, 31, 23, 30)))
+    assert row[-2].tzinfo is datetime.timezone.utc
+    assert row[-1] == "2026-05"
+
+
+def test_ndjson_lines_splits_across_chunks():
+    async def chunks():
+        for chunk in (b'{"a": 1}\n{"b"', b': 2}\n\n', b'{"c": 3}'):
+            yield chunk
+
+    async def collect():
+        return [line async for line in ndjson_lines(chunks())]
+
+    assert asyncio.run(collect()) == [b'{"a": 1}', b'{"b": 2}', b'{"c": 3}']
+
+
+@pytest.mark.skipif(not TEST_POSTGRES_URL, reason="TEST_POSTGRES_URL not set")
+def test_copy_cost_tracking_streams_rows():
+    psycopg = pytest.importorskip("psycopg")
+    schema = f"test_{uuid.uuid4().hex}"
+    with psycopg.connect(TEST_POSTGRES_URL, autocommit=True) as conn:
+        conn.execute(f"CREATE SCHEMA {schema}")
+        # Only the copied columns; the real table's enum, defaults and partitions don't change COPY
+        conn.execute(f"""
+            CREATE TABLE {schema}.cost_tracking (
+                organization_id UUID NOT NULL, desk_id UUID, task_id UUID, session_id BIGINT,
+                provider TEXT NOT NULL, model VARCHAR(100) NOT NULL,
+                input_tokens BIGINT, output_tokens BIGINT, total_tokens BIGINT,
+                input_cost NUMERIC(10, 6), output_cost NUMERIC(10, 6), total_cost NUMERIC(10, 6),
+                created_at TIMESTAMPTZ NOT NULL, billing_month VARCHAR(7) NOT NULL
+            )
+        """)
+    organization_id = uuid.uuid4()
+    url = make_url(TEST_POSTGRES_URL).set(drivername="postgresql+asyncpg")
+    engine = create_async_engine(url, connect_args={"server_settings": {"search_path": schema}})
+
+    async def rows():
+        for i in range(3):
+            yield crud.cost_tracking_row(
+                organization_id, _record(input_tokens=i, created_at=datetime.datetime(2026, 1, 1 + i))
+            )
+
+    async def load():
+        async with AsyncSession(engine) as db:
+            await crud.copy_cost_tracking(db, rows())
+        async with engine.connect() as conn:
+            result = await conn.exec_driver_sql("SELECT sum(total_tokens), count(*) FROM cost_tracking")
+            totals = result.one()
+        await engine.dispose()
+        return totals
+
+    try:
+        assert tuple(asyncio.run(load())) == (3, 3)
+    finally:
+        with psycopg.connect(TEST_POSTGRES_URL, autocommit=True) as conn:
+            conn.execute(f"DROP SCHEMA {schema} CASCADE")
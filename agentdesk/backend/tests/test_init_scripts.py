@@ -0,0 +1,89 @@
+import os
+import re
+import uuid
+from pathlib import Path
+
+import pytest
+
+# The hierarchy triggers need PostgreSQL with ltree; point this at a disposable database
+TEST_POSTGRES_URL = os.getenv("TEST_POSTGRES_URL")
+pytestmark = pytest.mark.skipif(not TEST_POSTGRES_URL, reason="TEST_POSTGRES_URL not set")
+
+INIT_SCRIPTS = Path(__file__).resolve().parent.parent / "app" / "database" / "init_scripts.sql"
+
+
+def _function_sql(name: str) -> str:
+    match = re.search(
+        rf"CREATE OR REPLACE FUNCTION {name}\(\).*?\$\$ LANGUAGE plpgsql;", INIT_SCRIPTS.read_text(), re.S
+    )
+    return match.group(0)
+
+
+@pytest.fixture
+def pg():
+    psycopg = pytest.importorskip("psycopg")
+    schema = f"test_{uuid.uuid4().hex}"
+    with psycopg.connect(TEST_POSTGRES_URL, autocommit=True) as conn:
+        conn.execute("CREATE EXTENSION IF NOT EXISTS ltree")
+        conn.execute(f"CREATE SCHEMA {schema}")
+        conn.execute(f"SET search_path TO {schema}, public")
+        conn.execute("""
+            CREATE TABLE desks (
+                id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+                organization_id UUID NOT NULL,
+                desk_id VARCHAR(100) NOT NULL,
+                reports_to_id UUID REFERENCES desks (id),
+                hierarchy_level INTEGER,
+                hierarchy_path LTREE,
+                UNIQUE (organization_id, desk_id)
+            )
+        """)
+        conn.execute(_function_sql("update_desk_hierarchy_path"))
+        conn.execute(_function_sql("update_desk_subtree_paths"))
+        conn.execute("""
+            CREATE TRIGGER trigger_desk_hierarchy
+                BEFORE INSERT OR UPDATE OF reports_to_id ON desks
+                FOR EACH ROW EXECUTE FUNCTION update_desk_hierarchy_path()
+        """)
+        conn.execute("""
+            CREATE TRIGGER trigger_desk_subtree
+                AFTER UPDATE OF reports_to_id ON desks
+                FOR EACH ROW
+                WHEN (OLD.hierarchy_path IS DISTINCT FROM NEW.hierarchy_path)
+                EXECUTE FUNCTION update_desk_subtree_paths()
+        """)
+        try:
+            yield conn
+        finally:
+            conn.execute(f"DROP SCHEMA {schema} CASCADE")
+
+
+def _add_desk(conn, org_id, desk_id, reports_to=None):
+    return conn.execute(
+        "INSERT INTO desks (organization_id, desk_id, reports_to_id) VALUES (%s, %s, %s) RETURNING id",
+        (org_id, desk_id, reports_to),
+    ).fetchone()[0]
+
+
+def _paths(conn, org_id):
+    rows = conn.execute(
+        "SELECT desk_id, hierarchy_path::text FROM desks WHERE organization_id = %s", (org_id,)
+    ).fetchall()
+    return dict(rows)
+
+
+def test_moving_a_desk_leaves_other_organizations_alone(pg):
+    org_a, org_b = uuid.uuid4(), uuid.uuid4()
+    desks = {}
+    # Both organizations use the same desk_ids, so their paths are identical
+    for org_id in (org_a, org_b):
+        ceo = _add_desk(pg, org_id, "ceo")
+        cto = _add_desk(pg, org_id, "cto", ceo)
+        dev = _add_desk(pg, org_id, "dev", cto)
+        _add_desk(pg, org_id, "intern", dev)
+        desks[org_id] = {"ceo": ceo, "cto": cto, "dev": dev}
+
+    pg.execute("UPDATE desks SET reports_to_id = %s WHERE id = %s", (desks[org_a]["ceo"], desks[org_a]["dev"]))
+
+    assert _paths(pg, org_a) == {"ceo": "ceo", "cto": "ceo.cto", "dev": "ceo.dev", "intern": "ceo.dev.intern"}
+    assert _paths(pg, org_b) == {"ceo": "ceo", "cto": "ceo.cto", "dev": "ceo.cto.dev", "intern": "ceo.cto.dev.intern"}
@@ -1,14 +1,204 @@
+import asyncio
+import logging
+import time
+import uuid
+
+import pytest
 from fastapi.testclient import TestClient
+from sqlalchemy import Column, MetaData, String, Table, Uuid, event, insert, select
+from app import audit, main
 from app.main import app
+from app.database import engine
+from app.database.database import TenantScopedSession, current_organization_id
+
+@pytest.fixture(scope="session")
+def client():
+    # Entered once so app startup and lifespan run a single time for the whole session
+    with TestClient(app) as c:
+        yield c
 
-client = TestClient(app)
+@pytest.fixture
+def query_counter():
+    statements = []
+    def count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+    event.listen(engine.sync_engine, "before_cursor_execute", count)
+    yield statements
+    event.remove(engine.sync_engine, "before_cursor_execute", count)
 
-def test_read_root():
+def test_read_root(client):
     response = client.get("/")
     assert response.status_code == 200
     assert response.json() == {"Hello": "World"}
 
-def test_read_agents():
+@pytest.mark.parametrize("log_level, expected", [(None, logging.WARNING), ("debug", logging.DEBUG)])
+def test_log_listener_sets_the_root_level_only_when_configured(monkeypatch, log_level, expected):
+    root = logging.getLogger()
+    original = root.level
+    root.setLevel(logging.WARNING)
+    monkeypatch.setattr(main, "LOG_LEVEL", log_level)
+    handler, listener = main.start_log_listener()
+    root.removeHandler(handler)
+    listener.stop()
+    try:
+        assert root.level == expected
+    finally:
+        root.setLevel(original)
+
+def test_read_agents(client):
     response = client.get("/agents")
     assert response.status_code == 200
     assert isinstance(response.json(), list)
+
+@pytest.mark.parametrize("path", ["/agents/", "/knowledge-bases/", "/datasources/"])
+def test_list_endpoints_query_count(client, path, query_counter):
+    response = client.get(path)
+    assert response.status_code == 200
+    # One query for the page plus at most one selectin query for its children
+    assert len(query_counter) <= 2
+
+def test_stats_single_query(client, query_counter):
+    response = client.get("/stats")
+    assert response.status_code == 200
+    assert set(response.json()) == {"agents", "knowledge_bases", "data_sources"}
+    assert len(query_counter) == 1
+
+def test_read_agent_is_served_from_a_snapshot(client, query_counter):
+    created = client.post("/agents/", json={"name": "snapshot", "description": "cached"}).json()
+    query_counter.clear()
+    first = client.get(f"/agents/{created['id']}")
+    second = client.get(f"/agents/{created['id']}")
+    assert first.json() == second.json() == created
+    # The second read is answered from the cache without touching the database
+    assert len(query_counter) == 1
+
+def test_sessions_begin_in_the_request_organization(client):
+    organization_id = uuid.uuid4()
+    seen = []
+    def record(session, transaction, connection):
+        seen.append(current_organization_id.get())
+    event.listen(TenantScopedSession, "after_begin", record)
+    try:
+        client.get("/agents/", headers={"X-Organization-ID": str(organization_id)})
+        client.get("/agents/")
+    finally:
+        event.remove(TenantScopedSession, "after_begin", record)
+    assert seen == [str(organization_id), None]
+
+@pytest.fixture
+def organization_id(client):
+    """An organization row audit entries can reference"""
+    organization_id = uuid.uuid4()
+    async def create():
+        async with engine.begin() as conn:
+            await conn.run_sync(audit.organizations.create, checkfirst=True)
+            await conn.execute(insert(audit.organizations).values(id=organization_id))
+    client.portal.call(create)
+    return organization_id
+
+def test_create_endpoints_queue_audit_entries(client, monkeypatch, organization_id):
+    written = []
+    async def capture(entries):
+        written.extend(entries)
+    monkeypatch.setattr(audit, "_write_batch", capture)
+    headers = {"X-Organization-ID": str(organization_id)}
+    agent = client.post("/agents/", json={"name": "audited"}, headers=headers).json()
+    kb = client.post("/knowledge-bases/", json={"name": "audited"}, headers=headers).json()
+    # Without an organization there is no audit_logs row to write
+    client.post("/agents/", json={"name": "unaudited"})
+    deadline = time.monotonic() + 2
+    while len(written) < 2 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    time.sleep(audit.AUDIT_FLUSH_INTERVAL * 2)
+    assert [(e["resource_type"], e["meta_data"]) for e in written] == [
+        ("agent", {"id": agent["id"]}),
+        ("knowledge_base", {"id": kb["id"]}),
+    ]
+    assert all(e["organization_id"] == organization_id and e["action"] == "create" for e in written)
+
+def test_unknown_organization_is_rejected_before_writing(client, query_counter):
+    headers = {"X-Organization-ID": str(uuid.uuid4())}
+    response = client.post("/agents/", json={"name": "stranger"}, headers=headers)
+    assert response.status_code == 400
+    assert not [s for s in query_counter if s.lstrip().upper().startswith("INSERT")]
+
+def test_audit_batch_drops_only_the_failing_organization(client, monkeypatch):
+    # Stand-in for audit_logs that SQLite can hold; a NULL action fails like a bad foreign key
+    metadata = MetaData()
+    rows = Table(
+        "audit_logs_batch_test", metadata,
+        Column("organization_id", Uuid, nullable=False),
+        Column("action", String(20), nullable=False),
+    )
+    monkeypatch.setattr(audit, "audit_logs", rows)
+    good, bad = uuid.uuid4(), uuid.uuid4()
+    async def write_and_read():
+        async with engine.begin() as conn:
+            await conn.run_sync(metadata.create_all)
+        await audit._write_batch([
+            {"organization_id": good, "action": "create"},
+            {"organization_id": bad, "action": None},
+            {"organization_id": good, "action": "update"},
+        ])
+        async with engine.connect() as conn:
+            return (await conn.execute(select(rows.c.organization_id, rows.c.action))).all()
+    assert sorted(client.portal.call(write_and_read), key=lambda row: row.action) == [
+        (good, "create"), (good, "update"),
+    ]
+
+def test_stopping_the_audit_writer_writes_everything_queued(monkeypatch):
+    monkeypatch.setattr(audit, "audit_queue", None)
+    monkeypatch.setattr(audit, "_writer", None)
+    written = []
+    async def slow_write(entries):
+        await asyncio.sleep(0.05)
+        written.extend(entries)
+    monkeypatch.setattr(audit, "_write_batch", slow_write)
+    monkeypatch.setattr(audit, "AUDIT_BATCH_SIZE", 2)
+    async def main():
+        audit.start_audit_writer()
+        for i in range(5):
+            audit.record_audit(organization_id=None, action=str(i))
+        # Let the writer pick up its first batch so one is in flight at shutdown
+        await asyncio.sleep(0.01)
+        await audit.stop_audit_writer()
+        # Entries recorded after shutdown are refused instead of queued for nobody
+        audit.record_audit(organization_id=None, action="late")
+    asyncio.run(main())
+    assert [entry["action"] for entry in written] == ["0", "1", "2", "3", "4"]
+
+def test_audit_logs_require_an_organization(client):
+    assert client.get("/audit-logs/").status_code == 400
+
+def test_bulk_create_endpoints(client, query_counter):
+    agents = [{"name": f"bulk-{i}"} for i in range(3)]
+    ids = client.post("/agents/bulk", json=agents).json()
+    # All rows go out in one multi-VALUES INSERT ... RETURNING
+    assert len([s for s in query_counter if s.lstrip().upper().startswith("INSERT")]) == 1
+    assert [client.get(f"/agents/{i}").json()["name"] for i in ids] == ["bulk-0", "bulk-1", "bulk-2"]
+
+    kb_id = client.post("/knowledge-bases/bulk", json=[{"name": "bulk-kb"}]).json()[0]
+    assert client.get(f"/knowledge-bases/{kb_id}").json()["datasources"] == []
+    sources = [{"name": f"doc-{i}", "type": "file", "uri": f"file:///doc-{i}"} for i in range(2)]
+    ds_ids = client.post(f"/knowledge-bases/{kb_id}/datasources/bulk", json=sources).json()
+    # The cached knowledge base is invalidated by the bulk insert
+    kb = client.get(f"/knowledge-bases/{kb_id}").json()
+    assert [ds["id"] for ds in kb["datasources"]] == ds_ids
+
+def test_read_agents_by_ids(client, query_counter):
+    ids = client.post("/agents/bulk", json=[{"name": "by-id-a"}, {"name": "by-id-b"}]).json()
+    query_counter.clear()
+    response = client.get("/agents/", params={"ids": [ids[1], ids[0], 10**9]})
+    # Requested order is kept and unknown ids are skipped
+    assert [agent["name"] for agent in response.json()] == ["by-id-b", "by-id-a"]
+    # One query for the agents plus one selectin query for their versions
+    assert len(query_counter) <= 2
+
+def test_cost_import_requires_an_organization(client):
+    assert client.post("/cost-tracking/import", content=b"").status_code == 400
+
+def test_cost_import_requires_postgres(client, organization_id):
+    if engine.dialect.name == "postgresql":
+        pytest.skip("COPY is available")
+    headers = {"X-Organization-ID": str(organization_id)}
+    assert client.post("/cost-tracking/import", content=b"", headers=headers).status_code == 501
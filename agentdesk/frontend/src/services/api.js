@@ -1,8 +1,22 @@
 const API_URL = '';
 
+// Responses are reused for a few seconds so remounts and quick navigation share one request
+const AGENTS_CACHE_TTL_MS = 5000;
+let agentsCache = null;
+
 export const getAgents = async () => {
-  const response = await fetch(`/agents/`);
-  return response.json();
+  const now = Date.now();
+  if (!agentsCache || agentsCache.expires <= now) {
+    const request = fetch(`/agents/`).then((response) => response.json());
+    agentsCache = { expires: now + AGENTS_CACHE_TTL_MS, request };
+    // A failed request is not served from the cache
+    request.catch(() => {
+      if (agentsCache && agentsCache.request === request) {
+        agentsCache = null;
+      }
+    });
+  }
+  return agentsCache.request;
 };
 
 export const createAgent = async (agent) => {
@@ -13,5 +27,7 @@ export const createAgent = async (agent) => {
     },
     body: JSON.stringify(agent),
   });
+  // The cached list no longer includes every agent
+  agentsCache = null;
   return response.json();
 };